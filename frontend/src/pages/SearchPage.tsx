@@ -15,6 +15,7 @@ export default function SearchPage() {
 
   const [results, setResults] = useState<SearchResult[]>([]);
   const [totalCount, setTotalCount] = useState(0);
+  const [totalExact, setTotalExact] = useState(true);
   const [loading, setLoading] = useState(false);
   const [taggingMode, setTaggingMode] = useState(false);
   const [activeWord, setActiveWord] = useState<ActiveWord | null>(null);
@@ -79,6 +80,8 @@ export default function SearchPage() {
       const params = new URLSearchParams({
         q: query,
         limit: String(PAGE_SIZE),
+        // The lemma text is never displayed
+        fields: "english,syllabary,phonetic,audio,tags",
         offset: String((page - 1) * PAGE_SIZE),
         use_lemma: String(filters.use_lemma),
         is_hypothetical: String(filters.is_hypothetical),
@@ -97,6 +100,7 @@ export default function SearchPage() {
       const data = await res.json();
       setResults(data.data || []);
       setTotalCount(data.meta?.total || 0);
+      setTotalExact(data.meta?.total_exact ?? true);
     } catch (err) {
       console.error(err);
     } finally {
@@ -151,7 +155,7 @@ export default function SearchPage() {
         <div className="flex justify-between items-center mb-6">
           <h2 className="text-xl font-semibold">
             {totalCount > 0
-              ? `Results (${totalCount})`
+              ? `Results (${totalCount.toLocaleString()}${totalExact ? "" : "+"})`
               : loading
                 ? "Searching..."
                 : "Enter a search to begin"}
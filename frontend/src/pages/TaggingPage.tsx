@@ -87,6 +87,8 @@ export default function TaggingPage() {
       const params = new URLSearchParams({
         q: query,
         limit: String(BATCH_SIZE),
+        // The lemma text is never displayed
+        fields: "english,syllabary,phonetic,audio,tags",
         offset: String(offset),
         use_lemma: String(filters.use_lemma),
         is_hypothetical: String(filters.is_hypothetical),
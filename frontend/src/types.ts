@@ -11,6 +11,9 @@ export interface SearchResult {
   audio?: string;
   lemma?: string;
   tags?: Tag[];
+  // Present when searching with highlight=true
+  highlights?: { english: number[]; syllabary: number[]; phonetic: number[] };
+  snippet?: string;
 }
 
 export interface Filters {
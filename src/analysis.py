@@ -2,7 +2,8 @@ from collections import Counter
 
 import spacy
 
-from src.models import SqliteDatabase, VerbStat, Verse, db
+from src.database import open_database
+from src.models import VerbStat, Verse, db
 
 
 def analyze_hypothetical_verbs():
@@ -11,7 +12,7 @@ def analyze_hypothetical_verbs():
     distinguishing between subclause (e.g., after 'if') and matrix clause.
     """
     # Initialize database proxy
-    database = SqliteDatabase("bible.db")
+    database = open_database("bible.db")
     db.initialize(database)
 
     if db.is_closed():
@@ -1,9 +1,16 @@
+import csv
+import hashlib
+import io
+import json
+import logging
 import os
 import time
 
 from flask import (
     Flask,
+    Response,
     abort,
+    g,
     jsonify,
     redirect,
     render_template,
@@ -11,29 +18,204 @@ from flask import (
     send_from_directory,
     url_for,
 )
-from peewee import SqliteDatabase
+from werkzeug.datastructures import MultiDict
 
-from src.models import Sentence, SentenceTag, TaggingGroup, db
+from src import metrics
+from src.autocomplete import Autocomplete
+from src.cache import CorpusVersion, Revisions, data_generation, group_generation
+from src.models import Revision, Sentence, SentenceTag, TaggingGroup, db
+from src.pool import ConnectionPool
 from src.search import SearchEngine
+from src.slowlog import SlowQueryLog
+from src.web import CompactJSONProvider, compress_response, encodings
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    # Configured before the startup reports below are logged. A server
+    # that imports the app configures logging itself.
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
 
 app = Flask(__name__, static_folder="../frontend/dist", static_url_path="/")
+app.json = CompactJSONProvider(app)
+
+# Read-only connections kept open for searches; mutations share a single
+# writer connection.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+# Seconds a request waits for a free pooled connection before failing.
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+
+pool = ConnectionPool("bible.db", size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+pool.install()
+sqlite_settings = pool.describe()
+logger.info("SQLite settings: %s", sqlite_settings)
+
+# Totals above this are reported as "N+" instead of being counted exactly.
+SEARCH_COUNT_LIMIT = int(os.environ.get("SEARCH_COUNT_LIMIT", 10000))
+
+# Upper bound on the memory held by cached search pages.
+SEARCH_CACHE_MB = int(os.environ.get("SEARCH_CACHE_MB", 64))
+
+# Load spaCy for lemma queries containing words missing from the lookup table.
+SEARCH_SPACY_FALLBACK = os.environ.get("SEARCH_SPACY_FALLBACK", "false") == "true"
+
+# JSON-lines file that searches taking at least SLOW_QUERY_MS are logged to,
+# along with a SLOW_QUERY_SAMPLE_RATE fraction of the faster ones. Unset
+# disables the log.
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 500))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_SAMPLE_RATE", 0))
+# The log is rotated at this size, keeping this many old files.
+SLOW_QUERY_LOG_MB = int(os.environ.get("SLOW_QUERY_LOG_MB", 10))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+
+slow_log = None
+if SLOW_QUERY_LOG:
+    slow_log = SlowQueryLog(
+        SLOW_QUERY_LOG,
+        threshold_ms=SLOW_QUERY_MS,
+        sample_rate=SLOW_QUERY_SAMPLE_RATE,
+        max_bytes=SLOW_QUERY_LOG_MB * 1024 * 1024,
+        backup_count=SLOW_QUERY_LOG_BACKUPS,
+    )
+
+searcher = SearchEngine(
+    count_limit=SEARCH_COUNT_LIMIT,
+    cache_bytes=SEARCH_CACHE_MB * 1024 * 1024,
+    spacy_fallback=SEARCH_SPACY_FALLBACK,
+    slow_log=slow_log,
+)
+# Hand the connection the engine opened at startup back to the pool
+db.close()
+suggester = Autocomplete()
+
+# Most searches accepted by one /api/search/batch request, and how many
+# threads (each with its own read-only connection) a parallel batch uses.
+SEARCH_BATCH_MAX = int(os.environ.get("SEARCH_BATCH_MAX", 100))
+SEARCH_BATCH_WORKERS = int(os.environ.get("SEARCH_BATCH_WORKERS", 4))
+
+# Serve /api/search/explain, which exposes the generated SQL, outside debug
+# mode.
+SEARCH_EXPLAIN = os.environ.get("SEARCH_EXPLAIN", "false") == "true"
+
+# Most completions /api/suggest returns per kind.
+SUGGEST_MAX_LIMIT = 50
+
+# Seconds a browser or proxy may reuse a search or tagging-group response
+# without revalidating its ETag.
+HTTP_MAX_AGE = int(os.environ.get("HTTP_MAX_AGE", 0))
+
+# ETags are built from state kept in the database (the corpus version and
+# the Revision counters every write bumps), so all worker processes agree
+# on them and see each other's writes.
+corpus_version = CorpusVersion()
+revisions = Revisions({"tags": data_generation, "groups": group_generation})
+
+
+@app.before_request
+def _start_timer():
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+def _record_metrics(response):
+    # Registered first, so it runs after the other after_request hooks
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    shape = metrics.filter_shape(request.args)
+    metrics.requests_total.inc(route, request.method, response.status_code, shape)
+    if "start_time" in g:
+        elapsed = time.perf_counter() - g.start_time
+        metrics.request_seconds.observe(elapsed, route, shape)
+    return response
+
+
+@metrics.registry.collector
+def _cache_metrics():
+    stats = searcher.cache_stats()
+    yield (
+        "search_cache_lookups_total",
+        "counter",
+        "Search cache lookups by cache and result.",
+        [
+            ({"cache": name, "result": result}, cache[key])
+            for name, cache in stats.items()
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        ],
+    )
+    yield (
+        "search_cache_hit_ratio",
+        "gauge",
+        "Fraction of search cache lookups that hit.",
+        [({"cache": name}, cache["hit_rate"]) for name, cache in stats.items()],
+    )
+    yield (
+        "search_cache_entries",
+        "gauge",
+        "Entries held by each search cache.",
+        [({"cache": name}, cache["entries"]) for name, cache in stats.items()],
+    )
+
+
+@metrics.registry.collector
+def _pool_metrics():
+    stats = pool.stats()
+    yield (
+        "db_connections",
+        "gauge",
+        "Pooled read-only connections by state.",
+        [({"state": "in_use"}, stats["in_use"]), ({"state": "idle"}, stats["idle"])],
+    )
+    yield (
+        "db_pool_size",
+        "gauge",
+        "Most read-only connections the pool will open.",
+        [({}, stats["size"])],
+    )
+    yield (
+        "db_connection_checkouts_total",
+        "counter",
+        "Read-only connections checked out of the pool.",
+        [({}, stats["checkouts"])],
+    )
+    yield (
+        "db_writes_total",
+        "counter",
+        "Transactions run on the writer connection.",
+        [({}, stats["writes"])],
+    )
 
-# Initialize database
-database = SqliteDatabase("bible.db")
-db.initialize(database)
 
-searcher = SearchEngine()
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.before_request
 def _db_connect():
     if db.is_closed():
         db.connect()
+    corpus_version.check(db)
+    revisions.check(db)
+
+
+@app.after_request
+def _db_optimize(response):
+    # Cheap unless the optimize interval has passed
+    pool.optimize()
+    return response
+
+
+@app.after_request
+def _compress(response):
+    return compress_response(response, request.accept_encodings)
 
 
 @app.teardown_request
 def _db_close(exc):
-    if not db.is_closed():
+    # Returns a pooled connection to the pool rather than closing it
+    if not db.is_closed() and not g.get("db_held"):
         db.close()
 
 
@@ -45,86 +227,374 @@ def serve():
 # API Routes
 
 
-@app.route("/api/search", methods=["GET"])
-def search_sentences():
-    query = request.args.get("q", "")
-
-    # Check if we have filters
-    has_filters = any(
-        k in request.args
-        for k in [
-            "is_command",
-            "is_hypothetical",
-            "is_inability",
-            "is_time_clause",
-            "tag",
-            "subclause_types",
-            "untagged_only",
-        ]
-    )
-
+FILTER_PARAMS = [
+    "is_command",
+    "is_hypothetical",
+    "is_inability",
+    "is_time_clause",
+    "tag",
+    "subclause_types",
+    "untagged_only",
+    "min_words",
+    "max_words",
+]
+
+
+def _flag(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    return value.lower() == "true"
+
+
+def _search_filters(args):
+    """
+    Parses the query and filter parameters shared by the search endpoints
+    into SearchEngine keyword arguments. Aborts with 400 if there is neither
+    a query nor a filter, or if a number is malformed.
+    """
+    query = args.get("q", "")
+    has_filters = any(k in args for k in FILTER_PARAMS)
     if not query and not has_filters:
         abort(400, description="Missing 'q' parameter or filters")
 
     try:
-        limit = int(request.args.get("limit", 10))
-        offset = int(request.args.get("offset", 0))
-        use_lemma = request.args.get("use_lemma", "false").lower() == "true"
-        sort = request.args.get("sort")
-        is_command = request.args.get("is_command")
-        if is_command is not None:
-            is_command = is_command.lower() == "true"
-        is_hypothetical = request.args.get("is_hypothetical")
-        if is_hypothetical is not None:
-            is_hypothetical = is_hypothetical.lower() == "true"
-        is_inability = request.args.get("is_inability")
-        if is_inability is not None:
-            is_inability = is_inability.lower() == "true"
-        is_time_clause = request.args.get("is_time_clause")
-        if is_time_clause is not None:
-            is_time_clause = is_time_clause.lower() == "true"
-        untagged_only = request.args.get("untagged_only", "false").lower() == "true"
-        tag_filter = request.args.get("tag")
-        subclause_types = request.args.getlist("subclause_types")
+        min_words = args.get("min_words")
+        if min_words is not None:
+            min_words = int(min_words)
+        max_words = args.get("max_words")
+        if max_words is not None:
+            max_words = int(max_words)
+    except ValueError:
+        abort(400, description="Invalid word count")
+
+    return query, {
+        "use_lemma": args.get("use_lemma", "false").lower() == "true",
+        "is_command": _flag(args, "is_command"),
+        "is_hypothetical": _flag(args, "is_hypothetical"),
+        "is_inability": _flag(args, "is_inability"),
+        "is_time_clause": _flag(args, "is_time_clause"),
+        "untagged_only": args.get("untagged_only", "false").lower() == "true",
+        "tag_filter": args.get("tag"),
+        "subclause_types": args.getlist("subclause_types") or None,
+        "min_words": min_words,
+        "max_words": max_words,
+        "mode": args.get("mode") or None,
+    }
+
+
+def _search_params(args):
+    """
+    Parses everything SearchEngine.search takes from request parameters.
+    """
+    query, filters = _search_filters(args)
+    try:
+        limit = int(args.get("limit", 10))
+        offset = int(args.get("offset", 0))
     except ValueError:
         abort(400, description="Invalid limit or offset")
+    return {
+        "query": query,
+        "limit": limit,
+        "offset": offset,
+        "sort": args.get("sort"),
+        "cursor": args.get("cursor"),
+        "highlight": args.get("highlight", "false").lower() == "true",
+        "fields": _fields(args),
+        **filters,
+    }
+
+
+# Response field -> SearchResult field
+RESPONSE_FIELDS = {
+    "english": "english",
+    "syllabary": "syllabary",
+    "phonetic": "phonetic",
+    "audio": "audio",
+    "lemma": "lemma_text",
+    "tags": "tags",
+}
+
+
+def _fields(args):
+    """
+    Parses ``fields`` (comma-separated and/or repeated) into SearchResult
+    field names, or None for all of them. ref_id is always returned.
+    """
+    values = args.getlist("fields")
+    if not values:
+        return None
+    names = [n.strip() for value in values for n in value.split(",")]
+    names = [n for n in names if n and n != "ref_id"]
+    unknown = [n for n in names if n not in RESPONSE_FIELDS]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(RESPONSE_FIELDS[n] for n in names)
+
+
+def _result_item(r, fields=None):
+    item = {"ref_id": r.ref_id}
+    for name, field in RESPONSE_FIELDS.items():
+        if fields is None or field in fields:
+            item[name] = getattr(r, field)
+    if r.highlights is not None:
+        item["highlights"] = r.highlights
+        item["snippet"] = r.snippet
+    return item
+
+
+def _page_data(page, fields=None):
+    return [_result_item(r, fields) for r in page.results]
+
+
+def _page_meta(page, timings=False):
+    meta = {
+        "count": len(page.results),
+        "total": page.total_count,
+        "total_exact": page.total_exact,
+        "next_cursor": page.next_cursor,
+        "suggestions": page.suggestions,
+    }
+    if timings:
+        meta["timings"] = page.timings
+    return meta
+
+
+def _etag(*parts):
+    key = "|".join(str(part) for part in parts)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def _conditional(etag, build):
+    """
+    Answers 304 if the client already has ``etag``, and otherwise the
+    response from ``build()``, marked so that caches revalidate it.
+
+    The ETag is weak: it identifies the data, but bodies built for it
+    differ in e.g. ``meta.execution_time``.
+    """
+    # A compressed response carries the ETag suffixed with its coding
+    variants = [etag] + [f"{etag}-{coding}" for coding in encodings()]
+    matched = next(
+        (v for v in variants if request.if_none_match.contains_weak(v)), None
+    )
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched, weak=True)
+    else:
+        response = build()
+        response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = HTTP_MAX_AGE
+    response.cache_control.must_revalidate = True
+    return response
+
+
+@app.route("/api/search", methods=["GET"])
+def search_sentences():
+    params = _search_params(request.args)
+    etag = _etag(
+        corpus_version.value,
+        revisions.value("tags"),
+        sorted(request.args.items(multi=True)),
+    )
+
+    def build():
+        start_time = time.time()
+        try:
+            page = searcher.search(**params)
+        except ValueError as e:
+            abort(400, description=str(e))
+        duration = time.time() - start_time
+
+        return jsonify(
+            {
+                "data": _page_data(page, params["fields"]),
+                "meta": {
+                    **_page_meta(page, _flag(request.args, "timings")),
+                    "execution_time": duration,
+                },
+            }
+        )
+
+    return _conditional(etag, build)
+
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_COLUMNS = [
+    "ref_id",
+    "english",
+    "syllabary",
+    "phonetic",
+    "audio",
+    "lemma",
+    "tags",
+]
+# Rows written per chunk of a streamed export
+EXPORT_CHUNK_ROWS = 200
+
+
+def _export_lines(results, fmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+
+    for n, r in enumerate(results, 1):
+        item = _result_item(r)
+        if writer:
+            item["tags"] = json.dumps(item["tags"], ensure_ascii=False)
+            writer.writerow([item[c] for c in EXPORT_COLUMNS])
+        else:
+            buffer.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.route("/api/search/export", methods=["GET"])
+def export_search():
+    query, filters = _search_filters(request.args)
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        abort(400, description=f"Invalid format: {fmt}")
+
+    # The query runs here, so a bad one is a 400 rather than a 200 that
+    # breaks off mid-stream
+    try:
+        results = searcher.export(query, sort=request.args.get("sort"), **filters)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    # Its cursor lives on the request's connection, which the response
+    # keeps past teardown and closes once the body has been sent
+    g.db_held = True
+
+    def close():
+        # Finalizes the cursor before the connection goes back to the pool
+        if hasattr(results, "close"):
+            results.close()
+        db.close()
+
+    response = Response(
+        _export_lines(results, fmt),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=search.{fmt}"},
+    )
+    response.call_on_close(close)
+    return response
+
+
+def _batch_args(item):
+    """
+    Turns one JSON search of a batch into request-style parameters, so it
+    is parsed exactly like a GET /api/search.
+    """
+    if not isinstance(item, dict):
+        abort(400, description="Each search must be an object")
+    args = MultiDict()
+    for name, value in item.items():
+        for v in value if isinstance(value, list) else [value]:
+            if isinstance(v, bool):
+                v = "true" if v else "false"
+            if v is not None:
+                args.add(name, str(v))
+    return args
+
+
+@app.route("/api/search/batch", methods=["POST"])
+def search_batch():
+    body = request.get_json(silent=True) or {}
+    items = body.get("searches")
+    if not isinstance(items, list) or not items:
+        abort(400, description="Missing 'searches' list")
+    if len(items) > SEARCH_BATCH_MAX:
+        abort(400, description=f"At most {SEARCH_BATCH_MAX} searches per batch")
+    searches = [_search_params(_batch_args(item)) for item in items]
+    workers = SEARCH_BATCH_WORKERS if body.get("parallel") else 1
 
     start_time = time.time()
-    results, total_count = searcher.search(
-        query,
-        limit=limit,
-        offset=offset,
-        use_lemma=use_lemma,
-        sort=sort,
-        is_command=is_command,
-        is_hypothetical=is_hypothetical,
-        is_inability=is_inability,
-        is_time_clause=is_time_clause,
-        tag_filter=tag_filter,
-        untagged_only=untagged_only,
-        subclause_types=subclause_types or None,
+    pages = searcher.search_many(searches, workers=workers)
+    duration = time.time() - start_time
+
+    data = []
+    for params, page in zip(searches, pages):
+        if isinstance(page, ValueError):
+            data.append({"error": str(page)})
+        else:
+            data.append(
+                {
+                    "data": _page_data(page, params["fields"]),
+                    "meta": _page_meta(page),
+                }
+            )
+    return jsonify(
+        {"data": data, "meta": {"count": len(data), "execution_time": duration}}
     )
+
+
+@app.route("/api/search/explain", methods=["GET"])
+def explain_search():
+    if not (SEARCH_EXPLAIN or app.debug):
+        abort(404)
+    params = _search_params(request.args)
+    try:
+        plan = searcher.explain(**params)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify({"data": plan})
+
+
+@app.route("/api/search/facets", methods=["GET"])
+def search_facets():
+    query, filters = _search_filters(request.args)
+
+    start_time = time.time()
+    try:
+        facets = searcher.facets(query, **filters)
+    except ValueError as e:
+        abort(400, description=str(e))
+    duration = time.time() - start_time
+
+    return jsonify({"data": facets, "meta": {"execution_time": duration}})
+
+
+@app.route("/api/suggest", methods=["GET"])
+def suggest():
+    prefix = request.args.get("prefix", "")
+    try:
+        limit = int(request.args.get("limit", suggester.limit))
+    except ValueError:
+        abort(400, description="Invalid limit")
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+    start_time = time.time()
+    suggestions = suggester.suggest(prefix, limit)
     duration = time.time() - start_time
 
     return jsonify(
         {
-            "data": [
-                {
-                    "ref_id": r.ref_id,
-                    "english": r.english,
-                    "syllabary": r.syllabary,
-                    "phonetic": r.phonetic,
-                    "audio": r.audio,
-                    "lemma": r.lemma_text,
-                    "tags": getattr(r, "tags", []),
-                }
-                for r in results
-            ],
-            "meta": {
-                "count": len(results),
-                "total": total_count,
-                "execution_time": duration,
+            "data": {
+                kind: [{"text": word, "count": count} for word, count in words]
+                for kind, words in suggestions.items()
             },
+            "meta": {"execution_time": duration},
+        }
+    )
+
+
+@app.route("/api/stats", methods=["GET"])
+def search_stats():
+    return jsonify(
+        {
+            "generation": data_generation.value,
+            "revisions": dict(revisions.values),
+            "cache": searcher.cache_stats(),
+            "pool": pool.stats(),
+            "sqlite": sqlite_settings,
+            "slow_queries_logged": slow_log.logged if slow_log else None,
         }
     )
 
@@ -140,7 +610,13 @@ def add_tag(ref_id):
 
     try:
         # Use primary key of SentenceTag if defined, or just replace by unique constraint
-        SentenceTag.replace(ref_id=ref_id, word_index=word_index, tag=tag).execute()
+        with pool.write() as writer:
+            SentenceTag.replace(ref_id=ref_id, word_index=word_index, tag=tag).execute(
+                writer
+            )
+            revision = Revision.bump(writer, "tags")
+        revisions.advance("tags", revision)
+        metrics.tag_writes_total.inc("tag", "add")
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -157,25 +633,32 @@ def remove_tag(ref_id):
     query = SentenceTag.delete().where(
         (SentenceTag.ref_id == ref_id) & (SentenceTag.word_index == word_index)
     )
-    rows = query.execute()
+    with pool.write() as writer:
+        rows = query.execute(writer)
+        revision = Revision.bump(writer, "tags")
+    revisions.advance("tags", revision)
+    metrics.tag_writes_total.inc("tag", "remove")
     return jsonify({"status": "success", "deleted": rows})
 
 
 @app.route("/api/tagging-groups", methods=["GET"])
 def list_tagging_groups():
-    groups = TaggingGroup.select().order_by(TaggingGroup.name)
-    return jsonify(
-        [
-            {
-                "id": g.id,
-                "name": g.name,
-                "tags": g.tags,
-                "query": g.query.get("q", "") if isinstance(g.query, dict) else "",
-                "filters": g.query,
-            }
-            for g in groups
-        ]
-    )
+    def build():
+        groups = TaggingGroup.select().order_by(TaggingGroup.name)
+        return jsonify(
+            [
+                {
+                    "id": g.id,
+                    "name": g.name,
+                    "tags": g.tags,
+                    "query": g.query.get("q", "") if isinstance(g.query, dict) else "",
+                    "filters": g.query,
+                }
+                for g in groups
+            ]
+        )
+
+    return _conditional(_etag(corpus_version.value, revisions.value("groups")), build)
 
 
 @app.route("/api/tagging-groups", methods=["POST"])
@@ -190,17 +673,34 @@ def save_tagging_group():
 
     # Use name as a unique identifier for simplicity or use ref_id if you want
     # For now, let's just use replace or update by name
-    group, created = TaggingGroup.get_or_create(name=name, defaults={"ref_id": name})
-    group.tags = tags
-    group.query = query
-    group.save()
-
-    return jsonify({"status": "success", "id": group.id})
+    with pool.write() as writer:
+        group_id = (
+            TaggingGroup.select(TaggingGroup.id)
+            .where(TaggingGroup.name == name)
+            .scalar(writer)
+        )
+        if group_id is None:
+            group_id = TaggingGroup.insert(
+                name=name, ref_id=name, tags=tags, query=query
+            ).execute(writer)
+        else:
+            TaggingGroup.update(tags=tags, query=query).where(
+                TaggingGroup.id == group_id
+            ).execute(writer)
+        revision = Revision.bump(writer, "groups")
+    revisions.advance("groups", revision)
+    metrics.tag_writes_total.inc("group", "save")
+
+    return jsonify({"status": "success", "id": group_id})
 
 
 @app.route("/api/tagging-groups/<int:group_id>", methods=["DELETE"])
 def delete_tagging_group(group_id):
-    TaggingGroup.delete().where(TaggingGroup.id == group_id).execute()
+    with pool.write() as writer:
+        TaggingGroup.delete().where(TaggingGroup.id == group_id).execute(writer)
+        revision = Revision.bump(writer, "groups")
+    revisions.advance("groups", revision)
+    metrics.tag_writes_total.inc("group", "delete")
     return jsonify({"status": "success"})
 
 
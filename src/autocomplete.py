@@ -0,0 +1,92 @@
+import heapq
+import threading
+from bisect import bisect_left
+
+from src.cache import corpus_generation
+from src.models import SentenceIndex
+
+# Suggestion kind -> SentenceIndex column its words come from
+KINDS = {"terms": "english", "syllabary": "syllabary", "lemmas": "lemma_text"}
+# Prefixes up to this long have their top completions precomputed, since
+# their ranges of the vocabulary are the longest to scan
+SHORT_PREFIX = 2
+
+
+class Vocabulary:
+    """
+    The words of one SentenceIndex column as a sorted array, so the words
+    starting with a prefix are one contiguous slice found by binary search.
+    """
+
+    def __init__(self, rows, limit):
+        self.terms = [term for term, _ in rows]
+        self.counts = [count for _, count in rows]
+        self.limit = limit
+        self._short = {}
+        for i, term in enumerate(self.terms):
+            for n in range(1, min(SHORT_PREFIX, len(term)) + 1):
+                self._short.setdefault(term[:n], []).append(i)
+        for prefix, indices in self._short.items():
+            self._short[prefix] = self._top(indices, limit)
+
+    def _top(self, indices, limit):
+        best = heapq.nsmallest(limit, indices, key=lambda i: -self.counts[i])
+        return [(self.terms[i], self.counts[i]) for i in best]
+
+    def complete(self, prefix, limit):
+        """
+        Returns up to ``limit`` ``(word, documents)`` pairs starting with
+        ``prefix``, most frequent first.
+        """
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX and limit <= self.limit:
+            return self._short.get(prefix, [])[:limit]
+        start = bisect_left(self.terms, prefix)
+        # Every word starting with prefix sorts before prefix + U+10FFFF
+        end = bisect_left(self.terms, prefix + "\U0010ffff", start)
+        return self._top(range(start, end), limit)
+
+
+class Autocomplete:
+    """
+    Prefix completions for english words, syllabary words and lemmas,
+    ranked by how many sentences contain them. The vocabularies are read
+    from SentenceIndex on first use and again after a re-ingest.
+    """
+
+    def __init__(self, limit=10):
+        self.limit = limit
+        self._vocabularies = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _get_vocabularies(self):
+        # Tag writes leave the index alone, so only a new corpus rebuilds these
+        generation = corpus_generation.value
+        if self._vocabularies is None or self._generation != generation:
+            with self._lock:
+                if self._vocabularies is None or self._generation != generation:
+                    self._vocabularies = {
+                        kind: Vocabulary(
+                            SentenceIndex.term_counts([column]), self.limit
+                        )
+                        for kind, column in KINDS.items()
+                    }
+                    self._generation = generation
+        return self._vocabularies
+
+    def suggest(self, prefix, limit=None):
+        """
+        Returns ``{kind: [(word, documents), ...]}`` for each of KINDS.
+        English words and lemmas are indexed lowercased; syllabary keeps
+        its case.
+        """
+        limit = limit or self.limit
+        prefix = prefix.strip()
+        return {
+            kind: vocabulary.complete(
+                prefix if kind == "syllabary" else prefix.lower(), limit
+            )
+            for kind, vocabulary in self._get_vocabularies().items()
+        }
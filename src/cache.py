@@ -0,0 +1,203 @@
+import threading
+from collections import OrderedDict
+
+from src.models import Revision, db
+
+
+class Generation:
+    """
+    A counter that is bumped whenever the data it guards changes. Cached
+    values remember the generation they were computed under and are
+    discarded once it moves on.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+# Guards anything derived from Sentence and SentenceTag rows. Bumped by the
+# tag endpoints, by ingestion, and whenever the database is swapped out.
+data_generation = Generation()
+
+# Guards what is derived from the corpus alone (the filter index, spelling
+# dictionary, lemmas and vocabularies), which tag writes leave untouched.
+# Bumped by ingestion and whenever the database is swapped out.
+corpus_generation = Generation()
+
+
+def _database_swapped(_):
+    data_generation.bump()
+    corpus_generation.bump()
+
+
+db.attach_callback(_database_swapped)
+
+# Bumped by the tagging-group endpoints.
+group_generation = Generation()
+
+
+class CorpusVersion:
+    """
+    Follows the database's PRAGMA user_version, which ingest_sentences bumps
+    after rebuilding the corpus, possibly from another process. Seeing it
+    change bumps data_generation and corpus_generation, so this process
+    drops its caches and reloads its indexes too.
+    """
+
+    def __init__(self):
+        self.value = None
+        self._lock = threading.Lock()
+
+    def check(self, database):
+        version = database.execute_sql("PRAGMA user_version").fetchone()[0]
+        with self._lock:
+            if version != self.value:
+                if self.value is not None:
+                    data_generation.bump()
+                    corpus_generation.bump()
+                self.value = version
+        return version
+
+
+class Revisions:
+    """
+    Follows the Revision counters, which tag and tagging-group writes bump
+    inside their transaction, possibly in another process. A counter
+    moving bumps the Generation it guards, so this process drops its
+    caches too. ``generations`` maps counter names to those Generations.
+    """
+
+    def __init__(self, generations):
+        self.generations = generations
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def check(self, database):
+        rows = dict(
+            Revision.select(Revision.name, Revision.value).tuples().execute(database)
+        )
+        with self._lock:
+            for name, generation in self.generations.items():
+                value = rows.get(name, 0)
+                if name in self.values and self.values[name] != value:
+                    generation.bump()
+                self.values[name] = value
+        return dict(self.values)
+
+    def advance(self, name, value):
+        """
+        Records a write made by this process, which committed counter
+        ``value``. Bumps the Generation unless a check() already saw it.
+        """
+        with self._lock:
+            if value > self.values.get(name, 0):
+                self.generations[name].bump()
+                self.values[name] = value
+
+    def value(self, name):
+        return self.values.get(name, 0)
+
+
+class LRUCache:
+    """
+    A small thread-safe least-recently-used cache tied to a Generation.
+    The whole cache is dropped as soon as the generation changes.
+
+    Eviction is bounded by entry count and, when ``sizeof`` is given, by
+    the estimated total size in bytes of the cached values.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, sizeof=None, generation=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.generation = generation or data_generation
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._seen_generation = self.generation.value
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_generation(self):
+        current = self.generation.value
+        if current != self._seen_generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self._seen_generation = current
+
+    def _pop_oldest(self):
+        key, _ = self._entries.popitem(last=False)
+        self._bytes -= self._sizes.pop(key, 0)
+        self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._check_generation()
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value, generation=None):
+        """
+        Stores ``value``. Pass the generation read before computing it so a
+        value computed across a concurrent write is not cached as current.
+        """
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._seen_generation:
+                return
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key, 0)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                self._pop_oldest()
+            while self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._pop_oldest()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,95 @@
+import os
+import time
+
+from peewee import SqliteDatabase
+
+# Runtime profile applied to every connection to bible.db, by the app and
+# by the ingest scripts alike.
+
+# Memory-mapped I/O window; reads within it skip the read() syscall copy.
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", 256))
+# Page cache per connection.
+SQLITE_CACHE_MB = int(os.environ.get("SQLITE_CACHE_MB", 64))
+# How long a connection waits on a lock before raising "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Seconds between PRAGMA optimize runs in a long-lived process.
+SQLITE_OPTIMIZE_INTERVAL = int(os.environ.get("SQLITE_OPTIMIZE_INTERVAL", 3600))
+
+# Settings shown by describe_database()
+REPORTED_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+    "busy_timeout",
+)
+
+
+def sqlite_pragmas(read_only=False):
+    """
+    The PRAGMAs run on each new connection. WAL lets readers carry on while
+    a tag is being written; the journal mode is stored in the database file,
+    so it is only set from writable connections.
+    """
+    pragmas = [
+        ("mmap_size", SQLITE_MMAP_MB * 1024 * 1024),
+        # Negative sizes are in KiB rather than pages
+        ("cache_size", -SQLITE_CACHE_MB * 1024),
+        ("temp_store", "memory"),
+        ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS),
+    ]
+    if not read_only:
+        pragmas = [("journal_mode", "wal"), ("synchronous", "normal")] + pragmas
+    return pragmas
+
+
+def open_database(path, read_only=False, database_class=SqliteDatabase, **kwargs):
+    """
+    Creates a database for ``path`` with the runtime profile applied. Pass
+    ``database_class`` for e.g. a pooled database.
+    """
+    return database_class(path, pragmas=sqlite_pragmas(read_only), **kwargs)
+
+
+def describe_database(database):
+    """
+    Returns the effective value of each profile setting on a connection of
+    ``database``, which may differ from what was asked for (e.g. mmap_size
+    is capped at compile time).
+    """
+    settings = {}
+    with database.connection_context():
+        for name in REPORTED_PRAGMAS:
+            settings[name] = database.execute_sql(f"PRAGMA {name}").fetchone()[0]
+    return settings
+
+
+def bump_corpus_version(database):
+    """
+    Increments PRAGMA user_version, which serving processes watch to tell
+    that the corpus has been rebuilt.
+    """
+    version = database.execute_sql("PRAGMA user_version").fetchone()[0]
+    database.execute_sql(f"PRAGMA user_version = {int(version) + 1}")
+    return version + 1
+
+
+class Optimizer:
+    """
+    Runs PRAGMA optimize, which refreshes the query planner's statistics
+    where they have drifted, at most once per ``interval`` seconds.
+    """
+
+    def __init__(self, interval=SQLITE_OPTIMIZE_INTERVAL):
+        self.interval = interval
+        self.last_run = time.monotonic()
+        self.runs = 0
+
+    def due(self):
+        return self.interval > 0 and time.monotonic() - self.last_run >= self.interval
+
+    def run(self, database):
+        self.last_run = time.monotonic()
+        database.execute_sql("PRAGMA optimize")
+        self.runs += 1
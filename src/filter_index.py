@@ -0,0 +1,143 @@
+from peewee import fn
+
+from src.models import Sentence, SentenceClause
+from src.sidecar import Sidecar
+
+FLAGS = ("is_command", "is_hypothetical", "is_inability", "is_time_clause")
+
+
+class FilterIndex(Sidecar):
+    """
+    Precomputed per-sentence bitmaps for the boolean mood and time-clause
+    flags and the subclause dependency labels. Bit ``n`` of a bitmap is set when the
+    Sentence with rowid ``n`` has that flag or label, so filters resolve
+    to integer AND/OR before any SQL runs.
+    """
+
+    SUFFIX = "filters"
+    VERSION = 2
+
+    def __init__(self, bitmaps, row_count, max_id):
+        self.bitmaps = bitmaps
+        self.row_count = row_count
+        self.max_id = max_id
+
+    @classmethod
+    def build(cls):
+        members = {"all": [], "any_subclause": []}
+        for name in FLAGS:
+            members[name] = []
+
+        rows = Sentence.select(
+            Sentence.id,
+            Sentence.is_command,
+            Sentence.is_hypothetical,
+            Sentence.is_inability,
+            Sentence.is_time_clause,
+        ).tuples()
+
+        for rowid, *flags in rows:
+            members["all"].append(rowid)
+            for name, value in zip(FLAGS, flags):
+                if value:
+                    members[name].append(rowid)
+
+        clauses = SentenceClause.select(
+            SentenceClause.sentence, SentenceClause.dep_label
+        ).tuples()
+        with_clause = set()
+        for rowid, label in clauses:
+            with_clause.add(rowid)
+            members.setdefault(f"dep:{label}", []).append(rowid)
+        members["any_subclause"] = sorted(with_clause)
+
+        bitmaps = {name: ids_to_bitmap(ids) for name, ids in members.items()}
+        all_ids = members["all"]
+        return cls(bitmaps, len(all_ids), max(all_ids, default=0))
+
+    def _dump(self):
+        header = {"rows": self.row_count, "max_id": self.max_id}
+        blobs = []
+        layout = {}
+        for name, bitmap in self.bitmaps.items():
+            blob = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+            layout[name] = len(blob)
+            blobs.append(blob)
+        header["bitmaps"] = layout
+        return header, b"".join(blobs)
+
+    @classmethod
+    def _restore(cls, header, body):
+        bitmaps = {}
+        pos = 0
+        for name, length in header["bitmaps"].items():
+            bitmaps[name] = int.from_bytes(body[pos : pos + length], "little")
+            pos += length
+        return cls(bitmaps, header["rows"], header["max_id"])
+
+    def is_current(self):
+        """
+        Cheap staleness check against the Sentence table.
+        """
+        row_count, max_id = Sentence.select(
+            fn.COUNT(Sentence.id), fn.MAX(Sentence.id)
+        ).scalar(as_tuple=True)
+        return row_count == self.row_count and (max_id or 0) == self.max_id
+
+    def candidates(
+        self,
+        is_command=None,
+        is_hypothetical=None,
+        is_inability=None,
+        subclause_types=None,
+        is_time_clause=None,
+    ):
+        """
+        Returns the bitmap of sentences passing the given filters, or None if
+        none of them is set. Multiple subclause types are combined with OR,
+        with the same "any"/"none" semantics as SearchEngine.search.
+        """
+        result = None
+        flags = (is_command, is_hypothetical, is_inability, is_time_clause)
+        for name, value in zip(FLAGS, flags):
+            if value:
+                bitmap = self.bitmaps[name]
+                result = bitmap if result is None else result & bitmap
+
+        if subclause_types:
+            combined = 0
+            for stype in subclause_types:
+                if stype == "any":
+                    combined |= self.bitmaps["any_subclause"]
+                elif stype == "none":
+                    combined |= self.bitmaps["all"] & ~self.bitmaps["any_subclause"]
+                else:
+                    combined |= self.bitmaps.get(f"dep:{stype}", 0)
+            result = combined if result is None else result & combined
+
+        return result
+
+
+def ids_to_bitmap(ids):
+    """
+    Packs rowids into a bitmap. Sets bits in a bytearray rather than OR-ing
+    into a growing int, which would copy the whole bitmap for every id.
+    """
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for rowid in ids:
+        data[rowid >> 3] |= 1 << (rowid & 7)
+    return int.from_bytes(data, "little")
+
+
+def bitmap_ids(bitmap):
+    """
+    Yields the rowids set in a bitmap, in ascending order.
+    """
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_index * 8 + low.bit_length() - 1
+            byte ^= low
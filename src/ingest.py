@@ -2,8 +2,9 @@ import json
 import os
 
 import spacy
-from peewee import SqliteDatabase, fn
+from peewee import fn
 
+from src.database import open_database
 from src.models import Book, Chapter, Entity, Verse, VerseEntity, VerseIndex, db
 
 DATA_DIR = "data"
@@ -25,7 +26,7 @@ def ingest_data():
         nlp = spacy.load("en_core_web_sm", disable=["textcat"])
 
     print("Connecting to database...")
-    database = SqliteDatabase("bible.db")
+    database = open_database("bible.db")
     db.initialize(database)
     db.connect()
 
@@ -1,10 +1,23 @@
 import json
 import os
+from collections import Counter, defaultdict
 
 import spacy
-from peewee import SqliteDatabase
 
-from src.models import Sentence, SentenceIndex, db
+from src.cache import corpus_generation, data_generation
+from src.database import bump_corpus_version, open_database
+from src.filter_index import FilterIndex
+from src.models import (
+    LemmaForm,
+    Sentence,
+    SentenceClause,
+    SentenceIndex,
+    SentenceTrigramIndex,
+    db,
+)
+from src.phonetic import fold_phonetic
+from src.search import CONTRACTION_RE
+from src.spelling import SpellingIndex
 
 DATA_FILE = os.path.join("data", "sentences.json")
 DB_FILE = "bible.db"
@@ -25,13 +38,14 @@ def ingest_sentences():
         nlp = spacy.load("en_core_web_sm", disable=["ner", "textcat"])
 
     print("Connecting to database...")
-    database = SqliteDatabase(DB_FILE)
+    database = open_database(DB_FILE)
     db.initialize(database)
     db.connect()
 
     # Drop and recreate to ensure schema updates
-    db.drop_tables([Sentence, SentenceIndex], safe=True)
-    db.create_tables([Sentence, SentenceIndex], safe=True)
+    tables = [Sentence, SentenceClause, SentenceIndex, SentenceTrigramIndex, LemmaForm]
+    db.drop_tables(tables, safe=True)
+    db.create_tables(tables, safe=True)
 
     print(f"Loading data from {DATA_FILE}...")
     with open(DATA_FILE, "r", encoding="utf-8") as f:
@@ -46,14 +60,18 @@ def ingest_sentences():
     batch_size = 100
     batch = []
     total_ingested = 0
+    subclauses_by_ref = {}
+    lemma_counts = defaultdict(Counter)
 
     with db.atomic():
         # Clear existing? Maybe. Or just upsert.
         # Let's clear for now to be clean, user said "only use the new source going forward"
         # but we are keeping Bible tables. We should clear Sentence table.
-        from src.models import SentenceTag
+        from src.models import Revision, SentenceTag
 
         Sentence.delete().execute()
+        SentenceTag.create_table(safe=True)
+        Revision.create_table(safe=True)
 
         for item in data:
             ref_id = item.get("id")
@@ -65,19 +83,24 @@ def ingest_sentences():
             # NLP Processing
             doc = nlp(english)
             lemma_text = " ".join([token.lemma_ for token in doc])
+            for token in doc:
+                # Contraction pieces too, so queries can map "n't" to "not"
+                if token.is_alpha or CONTRACTION_RE.fullmatch(token.lower_):
+                    lemma_counts[token.lower_][token.lemma_] += 1
 
             from src.nlp import (
                 get_subclause_types,
                 is_command,
                 is_hypothetical,
                 is_inability,
+                is_time_clause,
             )
 
             is_hypothetical = is_hypothetical(doc)
             is_command = is_command(doc)
             is_inability = is_inability(doc)
-            subclause_list = get_subclause_types(doc)
-            subclause_types = ",".join(subclause_list) if subclause_list else None
+            is_time_clause = is_time_clause(doc)
+            subclauses_by_ref[ref_id] = get_subclause_types(doc)
 
             # Prepare sentence record
             batch.append(
@@ -86,12 +109,16 @@ def ingest_sentences():
                     "english": english,
                     "syllabary": syllabary,
                     "phonetic": phonetic,
+                    "phonetic_folded": fold_phonetic(phonetic),
                     "audio": audio,
+                    # Words are split on spaces, as for SentenceTag.word_index
+                    "syllabary_length": len(syllabary),
+                    "word_count": len(syllabary.split()),
                     "lemma_text": lemma_text,
                     "is_hypothetical": is_hypothetical,
                     "is_command": is_command,
                     "is_inability": is_inability,
-                    "subclause_types": subclause_types,
+                    "is_time_clause": is_time_clause,
                 }
             )
 
@@ -105,12 +132,44 @@ def ingest_sentences():
             Sentence.insert_many(batch).execute()
             total_ingested += len(batch)
 
-    print("Rebuilding FTS index...")
+        # Existing tags survive re-ingestion; recount them for the new rows
+        SentenceTag.sync_tag_counts()
+
+        print("Storing subclause types...")
+        clause_rows = [
+            {"sentence": sentence_id, "dep_label": label}
+            for sentence_id, ref_id in Sentence.select(
+                Sentence.id, Sentence.ref_id
+            ).tuples()
+            for label in subclauses_by_ref.get(ref_id, ())
+        ]
+        for i in range(0, len(clause_rows), batch_size):
+            SentenceClause.insert_many(clause_rows[i : i + batch_size]).execute()
+
+        print("Storing lemma lookup table...")
+        lemma_rows = [
+            {"form": form, "lemma": counts.most_common(1)[0][0]}
+            for form, counts in lemma_counts.items()
+        ]
+        for i in range(0, len(lemma_rows), batch_size):
+            LemmaForm.insert_many(lemma_rows[i : i + batch_size]).execute()
+
+    print("Rebuilding FTS indexes...")
     SentenceIndex.rebuild()
+    SentenceTrigramIndex.rebuild()
     print("Optimization...")
     SentenceIndex.optimize()
+    SentenceTrigramIndex.optimize()
+
+    print("Building filter index...")
+    FilterIndex.build().save(FilterIndex.path_for(DB_FILE))
+    print("Building spelling dictionary...")
+    SpellingIndex.build().save(SpellingIndex.path_for(DB_FILE))
 
     print(f"Complete! Ingested {total_ingested} sentences.")
+    bump_corpus_version(db)
+    data_generation.bump()
+    corpus_generation.bump()
     db.close()
 
 
@@ -0,0 +1,238 @@
+import threading
+import weakref
+
+# Latency histogram upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Search parameters whose presence makes up a request's filter shape
+SHAPE_PARAMS = (
+    "q",
+    "use_lemma",
+    "is_command",
+    "is_hypothetical",
+    "is_inability",
+    "is_time_clause",
+    "tag",
+    "subclause_types",
+    "untagged_only",
+    "sort",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def filter_shape(args):
+    """
+    Which of SHAPE_PARAMS a request set, e.g. "q+is_command", or "none".
+    Flags set to false do not count, since they do not filter.
+    """
+    present = [
+        name
+        for name in SHAPE_PARAMS
+        if args.get(name) and args.get(name).lower() != "false"
+    ]
+    return "+".join(present) or "none"
+
+
+class _Shard:
+    """
+    One thread's share of the metric values. Only its own thread writes to
+    it, so updates need no lock.
+    """
+
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self):
+        self.values = {}
+
+
+class Registry:
+    """
+    Counters and histograms kept in per-thread shards and summed when
+    scraped. The hot path is a dict update on the calling thread's shard;
+    the only lock is taken when a thread registers its shard and when it
+    exits, to fold the shard into the retired totals.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Values of live threads' shards, by shard id. When a thread exits
+        # its shard is collected and its values folded into _retired.
+        self._shards = {}
+        self._retired = {}
+        self._metrics = {}
+        self._collectors = []
+
+    def _values(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            key = id(shard)
+            with self._lock:
+                self._shards[key] = shard.values
+            weakref.finalize(shard, self._retire, key)
+        return shard.values
+
+    def _retire(self, key):
+        with self._lock:
+            values = self._shards.pop(key, None)
+            if values is not None:
+                _merge(self._retired, values)
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(self, name, help_text, labelnames)
+        self._metrics[name] = metric
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(self, name, help_text, labelnames, buckets)
+        self._metrics[name] = metric
+        return metric
+
+    def collector(self, func):
+        """
+        Registers ``func``, called at scrape time, returning
+        ``(name, type, help, [(labels dict, value), ...])`` tuples for
+        values read from elsewhere (caches, the connection pool).
+        """
+        self._collectors.append(func)
+        return func
+
+    def _merged(self):
+        """
+        Sums the retired totals and the shards of live threads.
+        """
+        totals = {}
+        with self._lock:
+            _merge(totals, self._retired)
+            for values in self._shards.values():
+                # dict() copies in one step under the GIL
+                _merge(totals, dict(values))
+        return totals
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        totals = self._merged()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            entries = sorted(
+                (labels, value)
+                for (metric_name, labels), value in totals.items()
+                if metric_name == name
+            )
+            for labels, value in entries:
+                lines.extend(metric.samples(labels, value))
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.items())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(into, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = into.get(key)
+            if current is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    current[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels, amount=1):
+        values = self.registry._values()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def samples(self, labels, value):
+        return [f"{self.name}{_labels(zip(self.labelnames, labels))} {value}"]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self.registry._values()
+        key = (self.name, labels)
+        # One slot per bucket (non-cumulative), then +Inf, sum and count
+        state = values.get(key)
+        if state is None:
+            state = values[key] = [0] * (len(self.buckets) + 3)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def samples(self, labels, state):
+        pairs = list(zip(self.labelnames, labels))
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), state):
+            cumulative += count
+            lines.append(
+                f"{self.name}_bucket{_labels(pairs + [('le', bound)])} {cumulative}"
+            )
+        lines.append(f"{self.name}_sum{_labels(pairs)} {state[-2]}")
+        lines.append(f"{self.name}_count{_labels(pairs)} {state[-1]}")
+        return lines
+
+
+# The process-wide registry and the metrics every part of the app shares
+registry = Registry()
+
+requests_total = registry.counter(
+    "http_requests_total",
+    "HTTP requests by route, method, status and filter shape.",
+    ("route", "method", "status", "shape"),
+)
+request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to build an HTTP response, by route and filter shape.",
+    ("route", "shape"),
+)
+tag_writes_total = registry.counter(
+    "tag_writes_total",
+    "Tag and tagging-group mutations.",
+    ("kind", "op"),
+)
@@ -1,6 +1,8 @@
 from peewee import *
 from playhouse.sqlite_ext import FTS5Model, JSONField, RowIDField, SearchField
 
+from src.database import open_database
+
 # Proxy for late initialization
 db = DatabaseProxy()
 
@@ -79,14 +81,36 @@ class Sentence(BaseModel):
     english = TextField()
     syllabary = TextField()
     phonetic = TextField()
+    # phonetic without tone or length marks, as indexed for search
+    phonetic_folded = TextField(default="")
     audio = CharField(null=True)
     lemma_text = TextField(null=True)
     is_command = BooleanField(default=False)
     is_hypothetical = BooleanField(default=False)
     is_inability = BooleanField(default=False)
-    subclause_types = CharField(
-        null=True
-    )  # Comma-separated list of subclause types (dep labels)
+    is_time_clause = BooleanField(default=False, index=True)
+    # Precomputed at ingest for sorting and filtering by size
+    syllabary_length = IntegerField(default=0, index=True)
+    word_count = IntegerField(default=0, index=True)
+    # Number of SentenceTag rows for this sentence, kept current by triggers
+    tag_count = IntegerField(default=0, index=True)
+
+
+class SentenceClause(BaseModel):
+    # One row per subclause type (dep label) found in a sentence
+    sentence = ForeignKeyField(Sentence, backref="clauses", on_delete="CASCADE")
+    dep_label = CharField()
+
+    class Meta:
+        # Covers label lookups without touching the table
+        indexes = ((("dep_label", "sentence"), True),)
+
+
+class LemmaForm(BaseModel):
+    # Lowercased word form -> its most frequent lemma in the corpus, so
+    # queries can be lemmatized without loading spaCy
+    form = CharField(unique=True)
+    lemma = CharField()
 
 
 class SentenceTag(BaseModel):
@@ -107,7 +131,43 @@ class SentenceTag(BaseModel):
         # Let's stick to unique constraint on (ref_id, word_index) effectively making it one tag slot.
         # Actually user might want to change the tag.
         # Let's make it unique on (ref_id, word_index).
-        indexes = ((("ref_id", "word_index"), True),)
+        indexes = (
+            (("ref_id", "word_index"), True),
+            (("tag", "ref_id"), False),
+        )
+
+    @classmethod
+    def create_table(cls, safe=True, **options):
+        super().create_table(safe=safe, **options)
+        # Keep Sentence.tag_count in sync. Counts are recomputed rather than
+        # incremented because REPLACE does not fire delete triggers.
+        recount = (
+            "UPDATE sentence SET tag_count = ("
+            "SELECT COUNT(*) FROM sentencetag WHERE ref_id = {row}.ref_id"
+            ") WHERE ref_id = {row}.ref_id;"
+        )
+        triggers = {
+            "sentencetag_count_insert": ("AFTER INSERT", recount.format(row="NEW")),
+            "sentencetag_count_delete": ("AFTER DELETE", recount.format(row="OLD")),
+            "sentencetag_count_update": (
+                "AFTER UPDATE OF ref_id",
+                recount.format(row="OLD") + recount.format(row="NEW"),
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cls._meta.database.execute_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {name} {event} ON sentencetag "
+                f"BEGIN {body} END"
+            )
+
+    @classmethod
+    def sync_tag_counts(cls):
+        """
+        Recomputes Sentence.tag_count from scratch, e.g. after the Sentence
+        table has been rebuilt underneath existing tags.
+        """
+        counts = cls.select(fn.COUNT(cls.id)).where(cls.ref_id == Sentence.ref_id)
+        Sentence.update(tag_count=counts).execute()
 
 
 class SentenceGroup(BaseModel):
@@ -126,19 +186,77 @@ class TaggingGroup(BaseModel):
     query = JSONField()
 
 
+class Revision(BaseModel):
+    """
+    Counters that tag and tagging-group writes increment in their own
+    transaction, so every serving process can tell its data has changed.
+    """
+
+    name = CharField(primary_key=True)
+    value = IntegerField(default=0)
+
+    @classmethod
+    def bump(cls, database, name):
+        """
+        Increments the ``name`` counter on ``database``, inside the caller's
+        transaction. Returns the new value.
+        """
+        cls.insert(name=name, value=1).on_conflict(
+            conflict_target=[cls.name], update={cls.value: cls.value + 1}
+        ).execute(database)
+        return cls.select(cls.value).where(cls.name == name).scalar(database)
+
+
 class SentenceIndex(FTS5Model):
     rowid = RowIDField()
     english = SearchField()
     lemma_text = SearchField()
     syllabary = SearchField()
+    phonetic_folded = SearchField()
 
     class Meta:
         database = db
         options = {"content": Sentence}
 
+    @classmethod
+    def term_counts(cls, columns):
+        """
+        Returns ``(term, documents)`` pairs for the terms indexed in any of
+        ``columns``, sorted by term, read through a temporary fts5vocab
+        table.
+        """
+        database = cls._meta.database
+        database.execute_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS temp.sentenceindex_vocab "
+            f"USING fts5vocab(main, {cls._meta.table_name}, col)"
+        )
+        placeholders = ", ".join("?" for _ in columns)
+        try:
+            cursor = database.execute_sql(
+                "SELECT term, SUM(doc) FROM temp.sentenceindex_vocab "
+                f"WHERE col IN ({placeholders}) GROUP BY term ORDER BY term",
+                list(columns),
+            )
+            return cursor.fetchall()
+        finally:
+            database.execute_sql("DROP TABLE temp.sentenceindex_vocab")
+
+
+class SentenceTrigramIndex(FTS5Model):
+    # Indexes every three-character sequence, so substrings inside
+    # syllabary and phonetic words (morphemes) can be matched without a
+    # LIKE scan
+    rowid = RowIDField()
+    syllabary = SearchField()
+    phonetic = SearchField()
+
+    class Meta:
+        database = db
+        options = {"content": Sentence, "tokenize": "trigram"}
+
 
 def init_db(db_path="bible.db"):
-    database = SqliteDatabase(db_path)
+    database = open_database(db_path)
     db.initialize(database)
     db.connect()
     db.create_tables(
@@ -151,10 +269,14 @@ def init_db(db_path="bible.db"):
             VerseEntity,
             VerbStat,
             Sentence,
+            SentenceClause,
             SentenceIndex,
+            SentenceTrigramIndex,
+            LemmaForm,
             SentenceTag,
             SentenceGroup,
             TaggingGroup,
+            Revision,
         ]
     )
     db.close()
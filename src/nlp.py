@@ -314,6 +314,22 @@ def get_subclause_types(doc: spacy.tokens.Doc) -> list[str]:
     return sorted(list(found))
 
 
+def is_time_clause(doc: spacy.tokens.Doc) -> bool:
+    """
+    Detects an adverbial clause introduced by a temporal subordinator.
+    Heuristic: an advcl head with a marker child ('after', 'until', ... as
+    mark, or 'when' as advmod) from a fixed set of time words.
+    """
+    time_markers = {"when", "while", "after", "before", "until", "since"}
+    for token in doc:
+        if token.dep_ != "advcl":
+            continue
+        for child in token.children:
+            if child.dep_ in ("mark", "advmod") and child.lower_ in time_markers:
+                return True
+    return False
+
+
 if __name__ == "__main__":
     nlp = create_nlp_pipeline()
     test_cases = [
@@ -0,0 +1,18 @@
+import unicodedata
+
+# Vowel length is written with a colon (or the IPA length mark)
+LENGTH_MARKS = {":", "ː"}
+
+
+def fold_phonetic(text):
+    """
+    Folds phonetic Cherokee into the form it is indexed under: tone and
+    other diacritics and vowel length marks removed, lowercased. Learners
+    type these inconsistently, so "dà:ná:ne:lo:hv́sga" and "dananelohvsga"
+    fold to the same thing.
+    """
+    decomposed = unicodedata.normalize("NFD", text or "")
+    stripped = "".join(
+        c for c in decomposed if not unicodedata.combining(c) and c not in LENGTH_MARKS
+    )
+    return unicodedata.normalize("NFC", stripped).lower()
@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+
+from playhouse.pool import PooledSqliteDatabase
+
+from src.database import Optimizer, describe_database, open_database, sqlite_pragmas
+from src.models import Revision, db
+
+
+class ReadOnlyPool(PooledSqliteDatabase):
+    """
+    Long-lived read-only connections, checked out by connect() and handed
+    back by close() instead of being closed, so each keeps its page cache
+    and prepared statements between requests.
+    """
+
+    def __init__(self, path, **kwargs):
+        self.checkouts = 0
+        self.peak_in_use = 0
+        # The pool hands a free connection to whichever thread asks next
+        super().__init__(
+            f"file:{path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            pragmas=sqlite_pragmas(read_only=True),
+            **kwargs,
+        )
+
+    def _connect(self):
+        with self._pool_lock:
+            conn = super()._connect()
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, len(self._in_use))
+            return conn
+
+
+class ConnectionPool:
+    """
+    Routes searches through a pool of read-only connections and every
+    mutation through one shared writer connection, one write at a time.
+
+    install() points the models' database proxy at the read pool. Writes go
+    through write(), which falls back to the proxy's own database when
+    something else (e.g. a test) has been installed in the meantime.
+    """
+
+    def __init__(self, path, size=8, timeout=10):
+        self.path = path
+        self.reader = ReadOnlyPool(path, max_connections=size, timeout=timeout)
+        self.writer = open_database(path, thread_safe=False, check_same_thread=False)
+        self._write_lock = threading.Lock()
+        self.writes = 0
+        self.optimizer = Optimizer()
+
+    def install(self):
+        # mode=ro cannot create the file (or switch it to WAL), or tables
+        # missing from an older database, so let the writer do it first
+        with self._write_lock:
+            self.writer.connect(reuse_if_open=True)
+            with self.writer.bind_ctx([Revision]):
+                Revision.create_table(safe=True)
+        db.initialize(self.reader)
+
+    @property
+    def active(self):
+        return db.obj is self.reader
+
+    @contextmanager
+    def write(self):
+        """
+        Yields the database to run a mutation against, inside a transaction.
+        Queries are routed to it with ``query.execute(database)``.
+        """
+        if not self.active:
+            with db.atomic():
+                yield db
+            return
+        with self._write_lock:
+            self.writer.connect(reuse_if_open=True)
+            with self.writer.atomic():
+                yield self.writer
+            self.writes += 1
+
+    def optimize(self):
+        """
+        Runs PRAGMA optimize on the writer if it is due. Returns whether it
+        ran.
+        """
+        if not self.active or not self.optimizer.due():
+            return False
+        with self._write_lock:
+            self.writer.connect(reuse_if_open=True)
+            self.optimizer.run(self.writer)
+        return True
+
+    def describe(self):
+        """
+        The effective SQLite settings of the read and write connections.
+        """
+        reader = describe_database(self.reader)
+        with self._write_lock:
+            self.writer.close()
+            writer = describe_database(self.writer)
+        return {"reader": reader, "writer": writer}
+
+    def stats(self):
+        reader = self.reader
+        with reader._pool_lock:
+            in_use = len(reader._in_use)
+            idle = len(reader._connections)
+        return {
+            "active": self.active,
+            "size": reader._max_connections,
+            "in_use": in_use,
+            "idle": idle,
+            "peak_in_use": reader.peak_in_use,
+            "checkouts": reader.checkouts,
+            "writes": self.writes,
+            "optimize_runs": self.optimizer.runs,
+        }
@@ -1,18 +1,409 @@
-import spacy
-from peewee import fn
+import base64
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from src.models import Sentence, SentenceIndex, SentenceTag, db
+from peewee import SQL, OperationalError, Select, Tuple, Value, fn, operator, reduce
+
+from src.cache import LRUCache, corpus_generation, data_generation
+from src.filter_index import (
+    FLAGS,
+    FilterIndex,
+    bitmap_ids,
+    ids_to_bitmap,
+)
+from src.models import (
+    LemmaForm,
+    Sentence,
+    SentenceClause,
+    SentenceIndex,
+    SentenceTag,
+    SentenceTrigramIndex,
+    db,
+)
+from src.phonetic import fold_phonetic
+from src.spelling import SpellingIndex
+
+logger = logging.getLogger(__name__)
+
+# Columns returned for each search hit; tags are aggregated in SQL
+RESULT_COLUMNS = (
+    Sentence.id,
+    Sentence.ref_id,
+    Sentence.english,
+    Sentence.syllabary,
+    Sentence.phonetic,
+    Sentence.audio,
+    Sentence.lemma_text,
+    Sentence.syllabary_length,
+    Sentence.word_count,
+)
+# Selected whatever ``fields`` asks for: cursors are built from them
+KEY_FIELDS = ("id", "ref_id", "syllabary_length", "word_count")
+# What search(fields=...) can choose from
+RESULT_FIELDS = tuple(c.name for c in RESULT_COLUMNS if c.name not in KEY_FIELDS) + (
+    "tags",
+)
+_RESULT_NAMES = [c.name for c in RESULT_COLUMNS] + [
+    "score",
+    "tags",
+    "highlights",
+    "snippet",
+]
+# Fields left out of a projection are None
+SearchResult = namedtuple(
+    "SearchResult", _RESULT_NAMES, defaults=(None,) * len(_RESULT_NAMES)
+)
+
+# Markers FTS5 wraps matched tokens in; control characters never occur in
+# the corpus text
+HIGHLIGHT_OPEN = "\x02"
+HIGHLIGHT_CLOSE = "\x03"
+SNIPPET_TOKENS = 16
+
+# sort parameter -> (column, descending)
+SORT_COLUMNS = {
+    "length_asc": (Sentence.syllabary_length, False),
+    "length_desc": (Sentence.syllabary_length, True),
+    "words_asc": (Sentence.word_count, False),
+    "words_desc": (Sentence.word_count, True),
+}
+
+# Contraction pieces spaCy's English tokenizer splits off ("do" + "n't",
+# "he" + "'s"). Ingest stores their lemmas ("n't" -> "not") in LemmaForm.
+CONTRACTION_RE = re.compile(r"n't|'(?:s|m|d|ll|re|ve)", re.IGNORECASE)
+# Words split the way spaCy splits contractions, and runs of anything else
+# (FTS5 operators, quotes, punctuation)
+QUERY_TOKEN_RE = re.compile(
+    r"\w+?(?=n't\b)|(?:n't|'(?:s|m|d|ll|re|ve))\b|\w+|[^\w\s]+", re.IGNORECASE
+)
+FTS_KEYWORDS = {"AND", "OR", "NOT", "NEAR"}
+# Operators lemma queries keep; the rest are read as words (NEAR) or dropped
+BOOLEAN_KEYWORDS = ("AND", "OR", "NOT")
+LEMMA_OPERATOR_CHARS = set('"*()')
+# SQLite errors caused by the MATCH expression rather than the database
+FTS_ERROR_PREFIXES = ("fts5:", "no such column", "unknown special query")
+
+# Filter-index candidate sets up to this size are fetched by rowid. Larger
+# ones are left to the SQL predicates, which can walk an index and stop at
+# LIMIT instead of loading and sorting every candidate.
+FILTER_INDEX_MAX_IDS = 500
+
+# Query modes: None for word search, "substring" for in-word matches on the
+# syllabary and phonetic text, "phonetic" for words of the folded phonetic
+# text
+SEARCH_MODES = (None, "substring", "phonetic")
+PHONETIC_PREFIX = "phonetic:"
+# SentenceIndex columns a query without a mode is matched against
+DEFAULT_COLUMNS = "english lemma_text syllabary"
+TRIGRAM = 3
+
+
+class SearchPage(tuple):
+    """
+    A ``(results, total_count)`` pair that also carries paging metadata
+    (e.g. ``next_cursor``) as attributes, so callers can keep unpacking it.
+    """
+
+    def __new__(cls, results, total_count, **meta):
+        page = super().__new__(cls, (results, total_count))
+        page.__dict__.update(meta)
+        return page
+
+    @property
+    def results(self):
+        return self[0]
+
+    @property
+    def total_count(self):
+        return self[1]
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named stage of a search, in
+    milliseconds.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = self.timings.get(name, 0) + elapsed
+
+
+@contextmanager
+def query_errors():
+    """
+    Re-raises SQLite's complaints about a MATCH expression (bad FTS5 syntax,
+    an unknown column filter) as ValueError, like other invalid input.
+    """
+    try:
+        yield
+    except OperationalError as e:
+        if str(e).startswith(FTS_ERROR_PREFIXES):
+            raise ValueError(f"Invalid search query: {e}") from e
+        raise
+
+
+def encode_cursor(sort_mode, key):
+    """
+    Encodes the sort key of the last row on a page into an opaque cursor.
+    """
+    payload = json.dumps([sort_mode, key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, sort_mode):
+    """
+    Decodes a cursor produced by encode_cursor. Raises ValueError if it is
+    malformed or was issued for a different sort order.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        cursor_mode, key = json.loads(payload)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if cursor_mode != sort_mode:
+        raise ValueError("Cursor does not match the requested sort order")
+    if sort_mode == "ref_id":
+        valid = isinstance(key, str)
+    else:
+        # [sort value, Sentence.id]; anything else cannot be bound by SQLite
+        valid = (
+            isinstance(key, list)
+            and len(key) == 2
+            and _is_number(key[0])
+            and isinstance(key[1], int)
+            and not isinstance(key[1], bool)
+        )
+    if not valid:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return key
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _fts_column(index, name):
+    """
+    Position of a column in an FTS5 index, as FTS5 auxiliary functions
+    expect, or None if the index does not have it.
+    """
+    names = [f.name for f in index._meta.sorted_fields if f.name != "rowid"]
+    return names.index(name) if name in names else None
+
+
+def phonetic_query(query):
+    """
+    Folds each word of ``query`` like the indexed phonetic text and quotes
+    it, so apostrophes and other marks cannot break the FTS5 syntax.
+    Operators and a trailing ``*`` (prefix match) are kept.
+    """
+    parts = []
+    for word in query.split():
+        if word in FTS_KEYWORDS:
+            parts.append(word)
+            continue
+        prefix = "*" if word.endswith("*") else ""
+        folded = fold_phonetic(word.rstrip("*"))
+        if folded:
+            parts.append('"{}"{}'.format(folded.replace('"', '""'), prefix))
+    return " ".join(parts)
+
+
+def match_expression(items):
+    """
+    Assembles lemmatized query items (lowercase words, AND/OR/NOT, and the
+    ``"``, ``*``, ``(`` and ``)`` operators) into a valid FTS5 expression.
+    Operators missing an operand, unmatched ``)`` and empty groups are
+    dropped, of two operators in a row only the second is kept, and open
+    groups and phrases are closed.
+    """
+    out = []
+    depth = 0
+    phrase = None
+
+    def after_operand():
+        return bool(out) and out[-1] not in BOOLEAN_KEYWORDS and out[-1] != "("
+
+    def add_operand(text):
+        # FTS5 only joins plain phrases implicitly; groups need an AND
+        if out and out[-1] == ")":
+            out.append("AND")
+        out.append(text)
+
+    def close_group():
+        while out[-1] in BOOLEAN_KEYWORDS:
+            out.pop()
+        if out[-1] == "(":
+            out.pop()
+        else:
+            out.append(")")
+
+    for item in items:
+        if phrase is not None:
+            if item == '"':
+                if phrase:
+                    add_operand('"{}"'.format(" ".join(phrase)))
+                phrase = None
+            elif item not in LEMMA_OPERATOR_CHARS:
+                phrase.append(item.lower())
+        elif item == '"':
+            phrase = []
+        elif item == "*":
+            if after_operand() and out[-1] != ")" and not out[-1].endswith("*"):
+                out[-1] += " *"
+        elif item in BOOLEAN_KEYWORDS:
+            if after_operand():
+                out.append(item)
+            elif out and out[-1] in BOOLEAN_KEYWORDS:
+                # "AND NOT": the last operator typed wins
+                out[-1] = item
+        elif item == "(":
+            if after_operand():
+                out.append("AND")
+            out.append("(")
+            depth += 1
+        elif item == ")":
+            if depth:
+                depth -= 1
+                close_group()
+        else:
+            add_operand(item)
+
+    if phrase:
+        add_operand('"{}"'.format(" ".join(phrase)))
+    for _ in range(depth):
+        close_group()
+    while out and out[-1] in BOOLEAN_KEYWORDS:
+        out.pop()
+    return " ".join(out)
+
+
+def highlighted_words(text):
+    """
+    Converts FTS5 highlight() output into the space-split word indices used
+    by SentenceTag.word_index. A highlighted phrase may span several words.
+    """
+    indices = []
+    inside = False
+    for i, word in enumerate(text.split(" ")):
+        if inside or HIGHLIGHT_OPEN in word:
+            indices.append(i)
+        opened = word.rfind(HIGHLIGHT_OPEN)
+        closed = word.rfind(HIGHLIGHT_CLOSE)
+        if opened != closed:
+            inside = opened > closed
+    return indices
+
+
+def _tags_json():
+    """
+    Correlated subquery aggregating a result row's tags into a JSON array.
+    """
+    PageTag = SentenceTag.alias()
+    return (
+        PageTag.select(
+            fn.json_group_array(
+                fn.json_object("word_index", PageTag.word_index, "tag", PageTag.tag)
+            )
+        )
+        .where(PageTag.ref_id == Sentence.ref_id)
+        .alias("tags")
+    )
+
+
+def _page_size(page):
+    """
+    Rough in-memory footprint of a cached SearchPage, in bytes.
+    """
+    size = 512
+    for r in page.results:
+        size += 400 + sum(
+            len(value)
+            for value in (r.english, r.syllabary, r.phonetic, r.lemma_text, r.audio)
+            if value
+        )
+        size += 100 * len(r.tags or ())
+    return size
 
 
 class SearchEngine:
-    def __init__(self, db_path="bible.db"):
+    def __init__(
+        self,
+        db_path="bible.db",
+        count_limit=None,
+        cache_entries=1024,
+        cache_bytes=64 * 1024 * 1024,
+        spacy_fallback=False,
+        slow_log=None,
+    ):
         self.db = db
         self.nlp = None
+        # Lemmatize forms missing from the LemmaForm table with spaCy. Off by
+        # default so serving processes never load a model.
+        self.spacy_fallback = spacy_fallback
+        self._lemmas = None
+        self._lemmas_generation = None
+        # Stop counting matches past this many rows and report the total as
+        # a lower bound. None counts exactly.
+        self.count_limit = count_limit
+        self._count_cache = LRUCache(max_entries=4096)
+        self._facet_cache = LRUCache(max_entries=1024)
+        self._result_cache = LRUCache(
+            max_entries=cache_entries, max_bytes=cache_bytes, sizeof=_page_size
+        )
         if self.db.is_closed():
             self.db.connect()
+        self.db_path = db_path
+        self.filter_index = None
+        self.spelling = None
+        self._indexes_generation = None
+        self._indexes_lock = threading.Lock()
+        self._refresh_indexes()
+        # A SlowQueryLog that slow (and sampled) searches are written to
+        self.slow_log = slow_log
+
+    def _refresh_indexes(self):
+        """
+        Loads the filter index and spelling dictionary that ingest writes
+        next to the database, and reloads them whenever the corpus changes.
+        """
+        generation = corpus_generation.value
+        if self._indexes_generation == generation:
+            return
+        with self._indexes_lock:
+            if self._indexes_generation == generation:
+                return
+            filter_index = FilterIndex.load(FilterIndex.path_for(self.db_path))
+            if filter_index is not None and not filter_index.is_current():
+                logger.warning(
+                    "Filter index is out of date; falling back to SQL filters."
+                )
+                filter_index = None
+            self.filter_index = filter_index
+            # Suggestions are only hints, so a stale dictionary is still used
+            self.spelling = SpellingIndex.load(SpellingIndex.path_for(self.db_path))
+            self._indexes_generation = generation
 
     def _get_nlp(self):
         if self.nlp is None:
+            import spacy
+
             try:
                 self.nlp = spacy.load(
                     "en_core_web_sm", disable=["parser", "textcat", "ner"]
@@ -26,6 +417,283 @@ class SearchEngine:
                 )
         return self.nlp
 
+    def _get_lemmas(self):
+        """
+        Loads the form -> lemma table written at ingest time, reloading it
+        after a re-ingest.
+        """
+        generation = corpus_generation.value
+        if self._lemmas is None or self._lemmas_generation != generation:
+            if LemmaForm.table_exists():
+                self._lemmas = dict(
+                    LemmaForm.select(LemmaForm.form, LemmaForm.lemma).tuples()
+                )
+            else:
+                self._lemmas = {}
+            self._lemmas_generation = generation
+        return self._lemmas
+
+    def lemmatize(self, query):
+        """
+        Replaces each word of ``query`` with its lemma from the lookup table.
+        Unknown words are lemmatized with spaCy if spacy_fallback is set, and
+        otherwise kept as typed (lowercased). AND, OR, NOT, phrases, prefix
+        ``*`` and parentheses are kept where FTS5 accepts them and other
+        punctuation is dropped, so the result is always a valid MATCH
+        expression (empty if the query has no words).
+        """
+        lemmas = self._get_lemmas()
+        # Curly apostrophes are tokenized like straight ones
+        tokens = QUERY_TOKEN_RE.findall(query.replace("\u2019", "'"))
+        words = [t.lower() for t in tokens]
+
+        def is_word(word):
+            return word.isalnum() or CONTRACTION_RE.fullmatch(word)
+
+        if self.spacy_fallback and any(
+            is_word(w) and w not in lemmas and t not in BOOLEAN_KEYWORDS
+            for t, w in zip(tokens, words)
+        ):
+            doc = self._get_nlp()(query)
+            fallback = {t.lower_: t.lemma_ for t in doc}
+        else:
+            fallback = {}
+
+        items = []
+        for token, word in zip(tokens, words):
+            if token in BOOLEAN_KEYWORDS:
+                items.append(token)
+            elif is_word(word):
+                lemma = lemmas.get(word) or fallback.get(word, word)
+                # Split a lemma like "'s" the way FTS5 tokenized lemma_text
+                items.extend(w.lower() for w in re.findall(r"\w+", lemma))
+            else:
+                items.extend(c for c in token if c in LEMMA_OPERATOR_CHARS)
+        return match_expression(items)
+
+    def cache_stats(self):
+        return {
+            "results": self._result_cache.stats(),
+            "counts": self._count_cache.stats(),
+            "facets": self._facet_cache.stats(),
+        }
+
+    def _count(self, q, key):
+        """
+        Returns ``(total, exact)`` for query ``q``, memoized under ``key``
+        until Sentence or SentenceTag rows change.
+        """
+        key = (key, self.count_limit)
+        cached = self._count_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation = data_generation.value
+        if self.count_limit is None:
+            counted = (q.count(), True)
+        else:
+            # Counting one row past the cap is enough to know it was hit.
+            total = q.limit(self.count_limit + 1).count()
+            counted = (min(total, self.count_limit), total <= self.count_limit)
+        self._count_cache.set(key, counted, generation=generation)
+        return counted
+
+    @staticmethod
+    def _normalize_filters(
+        is_command=None,
+        is_hypothetical=None,
+        is_inability=None,
+        subclause_types=None,
+        is_time_clause=None,
+        tag_filter=None,
+        untagged_only=False,
+        min_words=None,
+        max_words=None,
+    ):
+        """
+        Canonical form of the filter arguments, so equivalent calls share
+        cache entries. Flags only ever narrow the results, so falsy and None
+        mean the same thing.
+        """
+        if isinstance(subclause_types, str):
+            subclause_types = [subclause_types]
+        return {
+            "is_command": bool(is_command),
+            "is_hypothetical": bool(is_hypothetical),
+            "is_inability": bool(is_inability),
+            "subclause_types": tuple(sorted(set(subclause_types or ()))),
+            "is_time_clause": bool(is_time_clause),
+            "tag_filter": tag_filter or None,
+            "untagged_only": bool(untagged_only),
+            "min_words": min_words,
+            "max_words": max_words,
+        }
+
+    def _search_query(self, query, use_lemma, mode=None):
+        """
+        Turns the user's query into an ``(index, expression)`` pair: the FTS5
+        index to search and the MATCH expression to run against it. Returns
+        None when there is no query, and a None index for substrings too
+        short for the trigram index, which are matched with LIKE instead.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid search mode: {mode!r}")
+        query = (query or "").strip()
+        prefixed = mode is None and query.lower().startswith(PHONETIC_PREFIX)
+        if prefixed:
+            mode = "phonetic"
+            query = query[len(PHONETIC_PREFIX) :].strip()
+        if not query:
+            if prefixed:
+                raise ValueError("Phonetic query has no words to search for")
+            return None
+
+        if mode == "phonetic":
+            expression = phonetic_query(query)
+            if not expression:
+                # Otherwise it would read as no query and match everything
+                raise ValueError("Phonetic query has no words to search for")
+            return SentenceIndex, f"phonetic_folded: ({expression})"
+
+        if mode == "substring":
+            if len(query) < TRIGRAM:
+                return None, query
+            # A quoted string matches anywhere inside a word with the
+            # trigram tokenizer; quotes inside it are escaped by doubling.
+            escaped = query.replace('"', '""')
+            return SentenceTrigramIndex, f'"{escaped}"'
+
+        if use_lemma:
+            expression = self.lemmatize(query)
+            if not expression:
+                raise ValueError("Query has no words to search for")
+            # Grouped, since a column filter only covers the phrase after it
+            return SentenceIndex, f"lemma_text: ({expression})"
+        # The folded phonetic text is only for phonetic queries; its
+        # fragments split at apostrophes ("i", "a", "so") would otherwise
+        # match as English words.
+        return SentenceIndex, f"{{{DEFAULT_COLUMNS}}}: ({query})"
+
+    def _filtered_query(self, search, filters, columns):
+        """
+        Builds the unordered query selecting ``columns`` (plus a "score"
+        alias) for every sentence matching the search and filters.
+
+        Also returns the filter-index bitmap of the sentences passing the
+        mood and subclause filters, or None without an index or filters.
+        The bitmap gives totals; the rows are only selected by it when
+        there are few enough of them.
+        """
+        if search and search[0] is not None:
+            index, expression = search
+            q = (
+                Sentence.select(*columns, index.rank().alias("score"))
+                .join(index, on=(Sentence.id == index.rowid))
+                .where(index.match(expression))
+            )
+        elif search:
+            # Shorter than a trigram, so the index cannot help
+            text = search[1]
+            q = Sentence.select(*columns, Value(0).alias("score")).where(
+                Sentence.syllabary.contains(text) | Sentence.phonetic.contains(text)
+            )
+        else:
+            # If no query, just select all with a default score
+            q = Sentence.select(*columns, Value(0).alias("score"))
+
+        # Mood and subclause filters resolve through the precomputed bitmaps
+        # when an up-to-date filter index is available.
+        self._refresh_indexes()
+        candidates = None
+        if self.filter_index is not None:
+            candidates = self.filter_index.candidates(
+                is_command=filters["is_command"],
+                is_hypothetical=filters["is_hypothetical"],
+                is_inability=filters["is_inability"],
+                subclause_types=filters["subclause_types"],
+                is_time_clause=filters["is_time_clause"],
+            )
+
+        # Apply filters
+        by_rowid = (
+            candidates is not None
+            and bin(candidates).count("1") <= FILTER_INDEX_MAX_IDS
+        )
+        if by_rowid:
+            ids = json.dumps(list(bitmap_ids(candidates)))
+            q = q.where(Sentence.id.in_(SQL("(SELECT value FROM json_each(?))", [ids])))
+        else:
+            if filters["is_command"]:
+                q = q.where(Sentence.is_command == True)
+            if filters["is_hypothetical"]:
+                q = q.where(Sentence.is_hypothetical == True)
+            if filters["is_inability"]:
+                q = q.where(Sentence.is_inability == True)
+            if filters["is_time_clause"]:
+                # Classified at ingest from the advcl's marker word
+                q = q.where(Sentence.is_time_clause == True)
+
+        if filters["untagged_only"]:
+            # tag_count is maintained by triggers on SentenceTag
+            q = q.where(Sentence.tag_count == 0)
+
+        subclause_types = filters["subclause_types"]
+        if subclause_types and not by_rowid:
+            # Combine multiple subclause filters with OR
+            has_clause = fn.EXISTS(
+                SentenceClause.select(SQL("1")).where(
+                    SentenceClause.sentence == Sentence.id
+                )
+            )
+            labels = [t for t in subclause_types if t not in ("any", "none")]
+            clause_filters = []
+            if "any" in subclause_types:
+                clause_filters.append(has_clause)
+            if "none" in subclause_types:
+                clause_filters.append(~has_clause)
+            if labels:
+                clause_filters.append(
+                    Sentence.id.in_(
+                        SentenceClause.select(SentenceClause.sentence).where(
+                            SentenceClause.dep_label.in_(labels)
+                        )
+                    )
+                )
+            q = q.where(reduce(operator.or_, clause_filters))
+
+        if filters["min_words"] is not None:
+            q = q.where(Sentence.word_count >= filters["min_words"])
+        if filters["max_words"] is not None:
+            q = q.where(Sentence.word_count <= filters["max_words"])
+
+        if filters["tag_filter"]:
+            # Served by the (tag, ref_id) index on SentenceTag
+            tagged = SentenceTag.select(SentenceTag.ref_id).where(
+                SentenceTag.tag == filters["tag_filter"]
+            )
+            q = q.where(Sentence.ref_id.in_(tagged))
+
+        return q, candidates
+
+    @staticmethod
+    def _ordered(q, index, sort):
+        """
+        Applies the result order for ``sort`` and returns the query and the
+        sort mode cursors are issued for.
+
+        Every ordering ends in a unique column so that a cursor can resume
+        exactly after the last row it saw. The length and word-count sorts
+        walk their column's index (which ends in rowid) in either direction.
+        """
+        if sort in SORT_COLUMNS:
+            sort_column, descending = SORT_COLUMNS[sort]
+            if descending:
+                return q.order_by(sort_column.desc(), Sentence.id.desc()), sort
+            return q.order_by(sort_column, Sentence.id), sort
+        if index is not None:
+            return q.order_by(index.rank(), Sentence.id), "rank"
+        return q.order_by(Sentence.ref_id), "ref_id"
+
     def search(
         self,
         query,
@@ -40,127 +708,546 @@ class SearchEngine:
         is_time_clause=None,
         tag_filter=None,
         untagged_only=False,
+        min_words=None,
+        max_words=None,
+        cursor=None,
+        highlight=False,
+        mode=None,
+        fields=None,
     ):
         """
         Performs a full-text search on sentences using BM25 ranking.
+
+        ``fields`` limits which of RESULT_FIELDS are read from the database;
+        the others are None in the results. The ids and sort keys are always
+        read.
+
+        With ``mode="substring"`` the query is matched anywhere inside the
+        syllabary and phonetic words (e.g. a morpheme) through the trigram
+        index rather than as whole words. With ``mode="phonetic"`` (or a
+        query starting with ``phonetic:``) the query is folded like the
+        indexed phonetic text, so tone and length marks are optional.
+
+        Pages either by ``offset`` or, when ``cursor`` is given, by seeking
+        past the sort key encoded in it (keyset pagination), so deep pages
+        cost the same as the first one. Returns a SearchPage whose
+        ``next_cursor`` continues from the last row of this page and whose
+        ``total_exact`` is False when the total was capped at count_limit.
+
+        With ``highlight`` and a query, each result also carries
+        ``highlights``, the matched word indices of its english, syllabary
+        and phonetic text, and a short ``snippet`` around the best match.
+        ``use_lemma`` queries match lemma_text, whose tokens do not line up
+        with the english words, so their english list is always empty.
+
+        Pages are served from an in-process LRU cache keyed by the
+        normalized arguments until Sentence or SentenceTag rows change.
+
+        The page's ``timings`` gives the milliseconds spent in each stage
+        (parse or lemmatize, filter_index, count, fetch, hydrate, and
+        suggest when it ran), ``sql`` the page query and ``sql_params`` the
+        values bound to it (the final MATCH expression, cursor keys, id
+        lists), so the query can be replayed. A page served from
+        the cache keeps the timings of the search that computed it.
         """
-        search_query = query
-        if use_lemma:
-            nlp = self._get_nlp()
-            doc = nlp(query)
-            search_query = " ".join([token.lemma_ for token in doc])
-            search_query = f"lemma_text: {search_query}"
+        filters = self._normalize_filters(
+            is_command=is_command,
+            is_hypothetical=is_hypothetical,
+            is_inability=is_inability,
+            subclause_types=subclause_types,
+            is_time_clause=is_time_clause,
+            tag_filter=tag_filter,
+            untagged_only=untagged_only,
+            min_words=min_words,
+            max_words=max_words,
+        )
+        filter_key = tuple(filters.values())
+        if fields is None:
+            fields = RESULT_FIELDS
         else:
-            # Simple text match; might want to match English and maybe Syllabary?
-            # For now let's assume query is English or just matches text fields
-            # FTS5 default matches all columns if column not specified.
-            # But let's be specific if we want.
-            # actually "text: query" isn't valid for SentenceIndex unless we have a 'text' column.
-            # SentenceIndex has: english, lemma_text, syllabary.
-            # If we want to search all, we just pass the query string to match()
-            pass
-
-        # We construct the FTS5 query carefully.
-        # If use_lemma, we already set "lemma_text: ...".
-        # If not, let's just pass the query directly to FTS match, which searches all indexed columns.
-
-        if search_query:
-            q = (
-                Sentence.select(Sentence, SentenceIndex.rank().alias("score"))
-                .join(SentenceIndex, on=(Sentence.id == SentenceIndex.rowid))
-                .where(SentenceIndex.match(search_query))
+            fields = tuple(sorted(set(fields)))
+            unknown = set(fields) - set(RESULT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        cache_key = (
+            (query or "").strip(),
+            bool(use_lemma),
+            mode,
+            filter_key,
+            sort,
+            limit,
+            None if cursor else offset,
+            cursor or None,
+            bool(highlight),
+            fields,
+        )
+        generation = data_generation.value
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        # Normalized arguments, for the slow query log
+        arguments = {
+            "query": cache_key[0],
+            "use_lemma": bool(use_lemma),
+            "mode": mode,
+            **filters,
+            "sort": sort,
+            "limit": limit,
+            "offset": None if cursor else offset,
+            "cursor": cursor or None,
+            "highlight": bool(highlight),
+            "fields": fields,
+        }
+        timer = StageTimer()
+        with timer.stage("lemmatize" if use_lemma else "parse"):
+            search = self._search_query(query, use_lemma, mode)
+        columns = [c for c in RESULT_COLUMNS if c.name in KEY_FIELDS + fields]
+        with timer.stage("filter_index"):
+            q, candidates = self._filtered_query(search, filters, columns)
+        index = search[0] if search else None
+        if candidates == 0:
+            page = SearchPage(
+                [],
+                0,
+                next_cursor=None,
+                total_exact=True,
+                suggestions=[],
+                timings=timer.timings,
+                sql=None,
+                sql_params=None,
             )
-        else:
-            # If no query, just select all with a default score
-            from peewee import Value
+            self._result_cache.set(cache_key, page, generation=generation)
+            self._log_search(start, page, arguments)
+            return page
 
-            q = Sentence.select(Sentence, Value(0).alias("score"))
+        q, sort_mode = self._ordered(q, index, sort)
+        sort_column, _ = SORT_COLUMNS.get(sort_mode, (None, False))
 
-        # Apply filters
-        if is_command:
-            q = q.where(Sentence.is_command == True)
-        if is_hypothetical:
-            q = q.where(Sentence.is_hypothetical == True)
-        if is_inability:
-            q = q.where(Sentence.is_inability == True)
-
-        if untagged_only:
-            # Subquery to find all ref_ids that ARE tagged
-            tagged_ref_ids = SentenceTag.select(SentenceTag.ref_id)
-            q = q.where(Sentence.ref_id.not_in(tagged_ref_ids))
-
-        if subclause_types:
-            if isinstance(subclause_types, str):
-                subclause_types = [subclause_types]
+        with timer.stage("count"), query_errors():
+            if candidates is not None and not (
+                search
+                or filters["tag_filter"]
+                or filters["untagged_only"]
+                or filters["min_words"] is not None
+                or filters["max_words"] is not None
+            ):
+                # Filter-only query: the bitmap population is the exact total.
+                total_count, total_exact = bin(candidates).count("1"), True
+            else:
+                count_key = (index and index._meta.table_name, search and search[1])
+                total_count, total_exact = self._count(q, (count_key, filter_key))
 
-            # Combine multiple subclause filters with OR
-            clause_filters = []
-            for stype in subclause_types:
-                if stype == "any":
-                    clause_filters.append(Sentence.subclause_types.is_null(False))
-                elif stype == "none":
-                    clause_filters.append(Sentence.subclause_types.is_null(True))
+        q, names, highlighting = self._page_query(
+            q, index, sort_mode, cursor, limit, offset, columns, fields, highlight
+        )
+        # Compiled once, so the SQL can be reported without compiling again
+        sql, params = q.sql()
+        with timer.stage("fetch"), query_errors():
+            rows = self.db.execute_sql(sql, params).fetchall()
+
+        with timer.stage("hydrate"):
+            results = []
+            for row in rows:
+                values = dict(zip(names, row))
+                if "tags" in values:
+                    values["tags"] = json.loads(values["tags"])
+                if highlighting:
+                    values["highlights"] = {
+                        "english": highlighted_words(values.pop("english_marks")),
+                        "syllabary": highlighted_words(values.pop("syllabary_marks")),
+                        "phonetic": highlighted_words(values.pop("phonetic_marks")),
+                    }
+                results.append(SearchResult(**values))
+
+        next_cursor = None
+        if results and len(results) == limit:
+            last = results[-1]
+            if sort_column is not None:
+                key = [getattr(last, sort_column.name), last.id]
+            elif sort_mode == "rank":
+                key = [last.score, last.id]
+            else:
+                key = last.ref_id
+            next_cursor = encode_cursor(sort_mode, key)
+
+        suggestions = []
+        if total_count == 0 and search:
+            with timer.stage("suggest"):
+                suggestions = self.suggestions(query, mode)
+
+        page = SearchPage(
+            results,
+            total_count,
+            next_cursor=next_cursor,
+            total_exact=total_exact,
+            suggestions=suggestions,
+            timings=timer.timings,
+            sql=sql,
+            sql_params=list(params),
+        )
+        self._result_cache.set(cache_key, page, generation=generation)
+
+        self._log_search(start, page, arguments)
+        return page
+
+    def _log_search(self, start, page, arguments):
+        """
+        Hands a freshly run search to the slow query log, if there is one.
+        """
+        if self.slow_log is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.slow_log.record(elapsed, arguments, page)
+
+    @staticmethod
+    def _page_query(
+        q, index, sort_mode, cursor, limit, offset, columns, fields, highlight
+    ):
+        """
+        Narrows the ordered query ``q`` to one page and adds the tag and
+        highlight columns. Returns the query, the name of each selected
+        column, and whether highlights were added.
+        """
+        sort_column, descending = SORT_COLUMNS.get(sort_mode, (None, False))
+        if cursor:
+            key = decode_cursor(cursor, sort_mode)
+            if sort_column is not None:
+                value, last_id = key
+                if descending:
+                    q = q.where(Tuple(sort_column, Sentence.id) < Tuple(value, last_id))
                 else:
-                    clause_filters.append(Sentence.subclause_types.contains(stype))
-
-            if clause_filters:
-                from peewee import operator, reduce
-
-                q = q.where(reduce(operator.or_, clause_filters))
-
-        if is_time_clause:
-            # Must have advcl and contain time keywords
-            # This is a heuristic.
-            q = q.where(Sentence.subclause_types.contains("advcl"))
-            time_keywords = [
-                "when",
-                "while",
-                "after",
-                "before",
-                "until",
-                "since",
-                "as soon as",
-            ]
-            # Peewee OR for keywords
-            from peewee import operator, reduce
+                    q = q.where(Tuple(sort_column, Sentence.id) > Tuple(value, last_id))
+            elif sort_mode == "rank":
+                score, last_id = key
+                q = q.where(Tuple(index.rank(), Sentence.id) > Tuple(score, last_id))
+            else:
+                q = q.where(Sentence.ref_id > key)
+            q = q.limit(limit)
+        else:
+            q = q.limit(limit).offset(offset)
 
-            keyword_filters = [Sentence.english.contains(kw) for kw in time_keywords]
-            q = q.where(reduce(operator.or_, keyword_filters))
+        # Fetch the page as plain tuples rather than model instances, with
+        # each row's tags aggregated into a JSON array.
+        names = [c.name for c in columns] + ["score"]
+        if "tags" in fields:
+            q = q.select_extend(_tags_json())
+            names.append("tags")
 
-        if tag_filter:
-            q = (
-                q.join(SentenceTag, on=(Sentence.ref_id == SentenceTag.ref_id))
-                .where(SentenceTag.tag == tag_filter)
-                .distinct()
+        highlighting = highlight and index is not None
+        if highlighting:
+            fts = index._meta.entity
+            # The trigram index has no english column; nothing matched there.
+            # Phonetic matches are in phonetic_folded (trigram: phonetic),
+            # whose space-split words line up with Sentence.phonetic's.
+            phonetic = _fts_column(index, "phonetic_folded")
+            if phonetic is None:
+                phonetic = _fts_column(index, "phonetic")
+            positions = [
+                _fts_column(index, "english"),
+                _fts_column(index, "syllabary"),
+                phonetic,
+            ]
+            q = q.select_extend(
+                *[
+                    (
+                        fn.highlight(fts, pos, HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE)
+                        if pos is not None
+                        else Value("")
+                    )
+                    for pos in positions
+                ],
+                # From a displayed column, never lemma or folded phonetic text
+                fn.snippet(
+                    fts,
+                    positions[0] if positions[0] is not None else positions[1],
+                    "",
+                    "",
+                    "…",
+                    SNIPPET_TOKENS,
+                ),
             )
-        elif untagged_only:
-            subquery = SentenceTag.select(SentenceTag.ref_id)
-            q = q.where(Sentence.ref_id.not_in(subquery))
-        if sort == "length_asc":
-            q = q.order_by(fn.length(Sentence.syllabary))
-        elif sort == "length_desc":
-            q = q.order_by(fn.length(Sentence.syllabary).desc())
-        elif search_query:
-            q = q.order_by(SentenceIndex.rank())
+            names += ["english_marks", "syllabary_marks", "phonetic_marks", "snippet"]
+        return q, names, highlighting
+
+    def explain(
+        self,
+        query,
+        use_lemma=False,
+        mode=None,
+        sort=None,
+        limit=10,
+        offset=0,
+        cursor=None,
+        highlight=False,
+        fields=None,
+        **filters,
+    ):
+        """
+        Describes how search() would run with the same arguments: the SQL
+        and bound parameters of the count and page queries with SQLite's
+        EXPLAIN QUERY PLAN for each, and how many rows survive each stage (FTS match, filter index
+        bitmap, all filters, page). Bypasses the caches.
+        """
+        filters = self._normalize_filters(**filters)
+        fields = RESULT_FIELDS if fields is None else tuple(fields)
+        timer = StageTimer()
+
+        with timer.stage("lemmatize" if use_lemma else "parse"):
+            search = self._search_query(query, use_lemma, mode)
+        columns = [c for c in RESULT_COLUMNS if c.name in KEY_FIELDS + fields]
+        with timer.stage("filter_index"):
+            q, candidates = self._filtered_query(search, filters, columns)
+        index = search[0] if search else None
+
+        rows = {"fts_match": None, "filter_index": None}
+        if index is not None:
+            with timer.stage("fts_match"), query_errors():
+                rows["fts_match"] = (
+                    index.select(index.rowid).where(index.match(search[1])).count()
+                )
+        if candidates is not None:
+            rows["filter_index"] = bin(candidates).count("1")
+
+        # The same wrapper peewee's count() runs
+        count_q = Select([q.order_by().alias("_wrapped")], [fn.COUNT(SQL("1"))])
+        with timer.stage("count"):
+            rows["matches"] = count_q.bind(self.db).scalar()
+
+        q, sort_mode = self._ordered(q, index, sort)
+        q, _, _ = self._page_query(
+            q, index, sort_mode, cursor, limit, offset, columns, fields, highlight
+        )
+        with timer.stage("fetch"):
+            rows["page"] = len(q.tuples())
+
+        return {
+            "sort_mode": sort_mode,
+            "stages": {
+                name: self._explain_query(query_)
+                for name, query_ in (("count", count_q), ("page", q))
+            },
+            "rows": rows,
+            "timings": timer.timings,
+        }
+
+    def _explain_query(self, q):
+        sql, params = q.sql()
+        plan = self.db.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return {
+            "sql": sql,
+            "params": list(params),
+            "plan": [
+                {"id": row[0], "parent": row[1], "detail": row[3]} for row in plan
+            ],
+        }
+
+    def export(self, query, use_lemma=False, sort=None, mode=None, **filters):
+        """
+        Returns an iterator over every SearchResult matching ``query`` and
+        ``filters`` (the same arguments as search), in search order and with
+        tags. The query runs and its first row is read here, so invalid
+        arguments and queries raise ValueError before anything is streamed;
+        the connection open now must stay open until the iterator is done.
+
+        Rows are streamed from a single query as they are read, without a
+        count or the result cache, so memory stays flat however many match.
+        """
+        filters = self._normalize_filters(**filters)
+        search = self._search_query(query, use_lemma, mode)
+        q, candidates = self._filtered_query(search, filters, RESULT_COLUMNS)
+        if candidates == 0:
+            return iter(())
+        q, _ = self._ordered(q, search[0] if search else None, sort)
+        q = q.select_extend(_tags_json())
+
+        with query_errors():
+            cursor = q.tuples().iterator()
+            first = next(cursor, None)
+        if first is None:
+            return iter(())
+
+        def rows():
+            for row in itertools.chain([first], cursor):
+                yield SearchResult(*row[:-1], json.loads(row[-1]))
+
+        return rows()
+
+    def _search_or_error(self, kwargs):
+        try:
+            return self.search(**kwargs)
+        except ValueError as e:
+            return e
+
+    def _search_read_only(self, batch):
+        # Connections are per thread, so this one belongs to the worker
+        with self.db.connection_context():
+            self.db.execute_sql("PRAGMA query_only = 1")
+            try:
+                return [self._search_or_error(kwargs) for kwargs in batch]
+            finally:
+                # A pooled connection outlives the batch; later requests on
+                # it may still need temp tables
+                self.db.execute_sql("PRAGMA query_only = 0")
+
+    def search_many(self, searches, workers=1):
+        """
+        Runs several searches, each a dict of search() keyword arguments,
+        and returns their pages in the same order. A search that fails
+        validation yields its ValueError in place of a page.
+
+        Identical searches run once, and all of them share the lemma table
+        and result caches. With ``workers`` > 1 the searches are split
+        between that many threads, each on its own read-only connection.
+        """
+        search_keys = [
+            json.dumps(kwargs, sort_keys=True, default=str) for kwargs in searches
+        ]
+        unique = dict(zip(search_keys, searches))
+        keys = list(unique)
+
+        workers = min(workers, len(keys))
+        if workers <= 1:
+            pages = [self._search_or_error(unique[key]) for key in keys]
         else:
-            q = q.order_by(Sentence.ref_id)
+            batches = [
+                [unique[key] for key in keys[i::workers]] for i in range(workers)
+            ]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                done = list(executor.map(self._search_read_only, batches))
+            # Undo the round-robin split
+            pages = [None] * len(keys)
+            for i, batch_pages in enumerate(done):
+                pages[i::workers] = batch_pages
+
+        by_key = dict(zip(keys, pages))
+        return [by_key[key] for key in search_keys]
+
+    def suggestions(self, query, mode=None, limit=3):
+        """
+        "Did you mean" alternatives to ``query``, with each word the index
+        has never seen replaced by its closest known terms. Empty if every
+        word is known or there is no spelling index.
+        """
+        self._refresh_indexes()
+        if self.spelling is None or mode == "substring":
+            return []
+        query = (query or "").strip()
+        if query.lower().startswith(PHONETIC_PREFIX):
+            query = query[len(PHONETIC_PREFIX) :].strip()
+
+        # Folding lowercases and strips diacritics, as the index does
+        corrections = {}
+        for word in re.findall(r"\w+", query):
+            term = fold_phonetic(word)
+            if word in FTS_KEYWORDS or term.isdigit() or term in self.spelling.known:
+                continue
+            candidates = self.spelling.lookup(term, limit)
+            if candidates:
+                corrections[word] = candidates
+        if not corrections:
+            return []
+
+        suggestions = []
+        for i in range(max(len(c) for c in corrections.values())):
+            suggestion = re.sub(
+                r"\w+",
+                lambda m: (
+                    corrections[m[0]][min(i, len(corrections[m[0]]) - 1)]
+                    if m[0] in corrections
+                    else m[0]
+                ),
+                query,
+            )
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions[:limit]
+
+    def facets(self, query, use_lemma=False, mode=None, **filters):
+        """
+        Counts how many of the sentences matching ``query`` and ``filters``
+        (the same arguments as search) have each mood flag, subclause type
+        and tag, and how many are untagged.
+
+        The matching rowids are collected in one pass; the per-facet counts
+        then come from the filter index bitmaps when available, and from
+        grouped lookups by rowid otherwise. Cached like search pages.
+        """
+        filters = self._normalize_filters(**filters)
+        cache_key = (
+            (query or "").strip(),
+            bool(use_lemma),
+            mode,
+            tuple(filters.values()),
+        )
+        generation = data_generation.value
+        cached = self._facet_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        search = self._search_query(query, use_lemma, mode)
+        q, _ = self._filtered_query(search, filters, [Sentence.id])
+        with query_errors():
+            ids = [row[0] for row in q.tuples()]
+        in_matches = Sentence.id.in_(
+            SQL("(SELECT value FROM json_each(?))", [json.dumps(ids)])
+        )
 
-        total_count = q.count()
-        results = list(q.limit(limit).offset(offset))
+        moods = {}
+        subclauses = {}
+        if self.filter_index is not None:
+            matches = ids_to_bitmap(ids)
+            bitmaps = self.filter_index.bitmaps
+            for name in FLAGS:
+                moods[name] = bin(matches & bitmaps[name]).count("1")
+            for name, bitmap in bitmaps.items():
+                if name.startswith("dep:"):
+                    subclauses[name[4:]] = bin(matches & bitmap).count("1")
+            with_clause = bin(matches & bitmaps["any_subclause"]).count("1")
+            untagged = (
+                Sentence.select().where(in_matches & (Sentence.tag_count == 0)).count()
+            )
+        else:
+            sums = Sentence.select(
+                *[fn.COALESCE(fn.SUM(getattr(Sentence, name)), 0) for name in FLAGS],
+                fn.COALESCE(fn.SUM(Sentence.tag_count == 0), 0),
+            ).where(in_matches)
+            *flag_counts, untagged = sums.tuples().get()
+            moods = dict(zip(FLAGS, flag_counts))
 
-        # Attach tags to results
-        if results:
-            ref_ids = [r.ref_id for r in results]
-            tags = SentenceTag.select().where(SentenceTag.ref_id.in_(ref_ids))
+            labels = (
+                SentenceClause.select(
+                    SentenceClause.dep_label, fn.COUNT(SentenceClause.id)
+                )
+                .join(Sentence)
+                .where(in_matches)
+                .group_by(SentenceClause.dep_label)
+            )
+            subclauses = dict(labels.tuples())
+            with_clause = (
+                SentenceClause.select(SentenceClause.sentence)
+                .join(Sentence)
+                .where(in_matches)
+                .distinct()
+                .count()
+            )
 
-            # Map ref_id -> list of tags
-            tag_map = {}
-            for t in tags:
-                if t.ref_id not in tag_map:
-                    tag_map[t.ref_id] = []
-                tag_map[t.ref_id].append({"word_index": t.word_index, "tag": t.tag})
+        subclauses["any"] = with_clause
+        subclauses["none"] = len(ids) - with_clause
 
-            for r in results:
-                r.tags = tag_map.get(r.ref_id, [])
+        tags = (
+            SentenceTag.select(SentenceTag.tag, fn.COUNT(SentenceTag.ref_id.distinct()))
+            .join(Sentence, on=(SentenceTag.ref_id == Sentence.ref_id))
+            .where(in_matches)
+            .group_by(SentenceTag.tag)
+        )
 
-        return results, total_count
+        result = {
+            "total": len(ids),
+            "moods": moods,
+            "subclause_types": subclauses,
+            "tags": dict(tags.tuples()),
+            "untagged": untagged,
+        }
+        self._facet_cache.set(cache_key, result, generation=generation)
+        return result
@@ -0,0 +1,59 @@
+import json
+import os
+import zlib
+
+
+class Sidecar:
+    """
+    Base for the indexes ingest derives from the database and stores in a
+    file next to it, named by SUFFIX. The file is zlib-compressed: a JSON
+    header line carrying VERSION, then raw bytes.
+
+    Subclasses implement _dump() and _restore().
+    """
+
+    SUFFIX = None
+    VERSION = None
+
+    @classmethod
+    def path_for(cls, db_path):
+        return f"{db_path}.{cls.SUFFIX}"
+
+    def _dump(self):
+        """
+        Returns the ``(header, body)`` to store: a JSON-serializable dict
+        and bytes.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _restore(cls, header, body):
+        """
+        Rebuilds an instance from what _dump() returned.
+        """
+        raise NotImplementedError
+
+    def save(self, path):
+        header, body = self._dump()
+        header = {"version": self.VERSION, **header}
+        payload = json.dumps(header).encode("utf-8") + b"\n" + body
+        with open(path, "wb") as f:
+            f.write(zlib.compress(payload))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a file written by save(). Returns None if there is none or it
+        was written by an incompatible VERSION.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            payload = zlib.decompress(f.read())
+
+        # json.dumps never emits a raw newline, so the first one ends the header
+        header_bytes, _, body = payload.partition(b"\n")
+        header = json.loads(header_bytes)
+        if header.get("version") != cls.VERSION:
+            return None
+        return cls._restore(header, body)
@@ -0,0 +1,75 @@
+import json
+import logging
+import random
+import time
+from logging.handlers import RotatingFileHandler
+
+
+class SlowQueryLog:
+    """
+    Appends one JSON line per search that took at least ``threshold_ms``,
+    plus a random ``sample_rate`` fraction of the faster ones, to a file
+    rotated at ``max_bytes`` with ``backup_count`` old files kept.
+    """
+
+    def __init__(
+        self,
+        path,
+        threshold_ms=500,
+        sample_rate=0.0,
+        max_bytes=10 * 1024 * 1024,
+        backup_count=5,
+    ):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.logged = 0
+        # A logger of its own, so entries never reach the app's log output
+        self.logger = logging.getLogger(f"{__name__}.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    def reason(self, duration_ms):
+        """
+        Why a search taking ``duration_ms`` should be logged, or None.
+        """
+        if duration_ms >= self.threshold_ms:
+            return "slow"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def record(self, duration_ms, params, page):
+        """
+        Logs a search if it is slow or sampled. ``params`` are the
+        normalized search arguments and ``page`` the SearchPage returned.
+        """
+        reason = self.reason(duration_ms)
+        if reason is None:
+            return False
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "reason": reason,
+            "duration_ms": round(duration_ms, 3),
+            "params": params,
+            "timings": {k: round(v, 3) for k, v in page.timings.items()},
+            "total": page.total_count,
+            "total_exact": page.total_exact,
+            "returned": len(page.results),
+            "sql": page.sql,
+            "sql_params": page.sql_params,
+        }
+        self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+        self.logged += 1
+        return True
+
+    def close(self):
+        for handler in list(self.logger.handlers):
+            handler.close()
+            self.logger.removeHandler(handler)
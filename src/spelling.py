@@ -0,0 +1,127 @@
+from src.models import SentenceIndex
+from src.sidecar import Sidecar
+
+# SentenceIndex columns whose terms can be suggested
+VOCAB_COLUMNS = ("english", "lemma_text", "phonetic_folded")
+
+
+def _deletes(word, max_distance):
+    """
+    Every string reachable from ``word`` by removing up to ``max_distance``
+    characters, including ``word`` itself.
+    """
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent
+    transpositions) between ``a`` and ``b``, or ``limit + 1`` once it is
+    known to exceed ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, row = previous, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if (
+                before is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class SpellingIndex(Sidecar):
+    """
+    A SymSpell-style symmetric deletion dictionary over the terms of
+    SentenceIndex. Every term is stored under each string reachable from
+    (its first ``prefix_length`` characters) by deleting up to
+    ``max_distance`` characters; a misspelling finds its candidates by
+    looking up its own deletes, and only those few are checked with a real
+    edit distance.
+    """
+
+    SUFFIX = "spelling"
+    VERSION = 1
+
+    def __init__(self, terms, counts, max_distance=2, prefix_length=7):
+        self.terms = terms
+        self.counts = counts
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.known = set(terms)
+        self.deletes = {}
+        for i, term in enumerate(terms):
+            for key in _deletes(term[:prefix_length], max_distance):
+                self.deletes.setdefault(key, []).append(i)
+
+    @classmethod
+    def build(cls, max_distance=2, prefix_length=7):
+        """
+        Reads the terms and their document counts from an fts5vocab table
+        over SentenceIndex.
+        """
+        rows = [
+            (term, count)
+            for term, count in SentenceIndex.term_counts(VOCAB_COLUMNS)
+            if not term[0].isdigit()
+        ]
+        return cls(
+            [term for term, _ in rows],
+            [count for _, count in rows],
+            max_distance=max_distance,
+            prefix_length=prefix_length,
+        )
+
+    def _dump(self):
+        # Only the terms are stored; the deletes are cheap to regenerate
+        # and many times larger.
+        header = {
+            "max_distance": self.max_distance,
+            "prefix_length": self.prefix_length,
+            "terms": self.terms,
+            "counts": self.counts,
+        }
+        return header, b""
+
+    @classmethod
+    def _restore(cls, header, body):
+        return cls(
+            header["terms"],
+            header["counts"],
+            max_distance=header["max_distance"],
+            prefix_length=header["prefix_length"],
+        )
+
+    def lookup(self, word, limit=3):
+        """
+        Returns up to ``limit`` known terms within max_distance edits of
+        ``word``, closest and then most frequent first.
+        """
+        word = word.lower()
+        seen = set()
+        matches = []
+        for key in _deletes(word[: self.prefix_length], self.max_distance):
+            for i in self.deletes.get(key, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                distance = edit_distance(word, self.terms[i], self.max_distance)
+                if distance <= self.max_distance:
+                    matches.append((distance, -self.counts[i], self.terms[i]))
+        matches.sort()
+        return [term for _, _, term in matches[:limit]]
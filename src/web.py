@@ -0,0 +1,89 @@
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+
+# Both are optional speedups; everything works without them.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CompactJSONProvider(DefaultJSONProvider):
+    """
+    Serializes without whitespace, key sorting or \\u escapes (a syllabary
+    character is 3 bytes as UTF-8 and 6 escaped), with orjson when it is
+    installed.
+    """
+
+    compact = True
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        kwargs.pop("separators", None)
+        if orjson is None or kwargs:
+            return super().dumps(obj, separators=(",", ":"), **kwargs)
+        return orjson.dumps(obj, default=self.default).decode("utf-8")
+
+
+def encodings():
+    """
+    Content codings the server can produce, in order of preference.
+    """
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Picks the preferred coding the client accepts, or None.
+    """
+    for coding in encodings():
+        if accept_encodings[coding] > 0:
+            return coding
+    return None
+
+
+def compress_response(response, accept_encodings):
+    """
+    Compresses a JSON response body in place with the best coding the
+    client accepts. Streamed and already-encoded responses are left alone.
+    The ETag is suffixed with the coding, since the bytes differ.
+    """
+    response.vary.add("Accept-Encoding")
+    if (
+        response.mimetype != "application/json"
+        or response.is_streamed
+        or response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    coding = negotiate_encoding(accept_encodings)
+    body = response.get_data()
+    if coding is None or len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    if coding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        # No timestamp in the header, so equal bodies compress identically
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = coding
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{coding}", weak=weak)
+    return response
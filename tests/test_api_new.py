@@ -1,10 +1,23 @@
+import csv
+import gzip
+import io
+import json
 import os
 
 import pytest
 from peewee import SqliteDatabase
 
-from src.app import app
-from src.models import Sentence, SentenceIndex, SentenceTag, db
+from src.app import app, suggester
+from src.database import bump_corpus_version
+from src.models import (
+    Revision,
+    Sentence,
+    SentenceClause,
+    SentenceIndex,
+    SentenceTag,
+    TaggingGroup,
+    db,
+)
 
 
 @pytest.fixture
@@ -13,26 +26,26 @@ def client():
     test_db = SqliteDatabase(db_path)
     db.initialize(test_db)
     db.connect()
-    db.create_tables([Sentence, SentenceIndex, SentenceTag])
+    db.create_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag, Revision])
 
-    Sentence.create(
+    sentence = Sentence.create(
         ref_id="api1",
         english="Test sentence one",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
         is_hypothetical=True,
         is_command=False,
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    sentence = Sentence.create(
         ref_id="api2",
         english="Test sentence two",
         syllabary="...",
         phonetic="...",
-        subclause_types="relcl",
         is_hypothetical=False,
         is_command=True,
     )
+    SentenceClause.create(sentence=sentence, dep_label="relcl")
 
     SentenceIndex.rebuild()
 
@@ -41,7 +54,7 @@ def client():
         yield client
 
     if not test_db.is_closed():
-        db.drop_tables([Sentence, SentenceIndex, SentenceTag])
+        db.drop_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag, Revision])
         db.close()
     if os.path.exists(db_path):
         os.remove(db_path)
@@ -86,3 +99,262 @@ def test_static_proxy(client):
     # Since we moved static_folder to ../frontend/dist, it might error if it doesn't exist
     # but let's check if it handles it gracefully or if we should skip this.
     pass
+
+
+def test_api_search_cursor(client):
+    res = client.get("/api/search?q=test&limit=1")
+    data = res.get_json()
+    assert data["meta"]["total"] == 2
+    cursor = data["meta"]["next_cursor"]
+    assert cursor
+
+    res = client.get(f"/api/search?q=test&limit=1&cursor={cursor}")
+    second = res.get_json()
+    assert second["data"][0]["ref_id"] != data["data"][0]["ref_id"]
+
+    res = client.get("/api/search?q=test&limit=1&cursor=bogus")
+    assert res.status_code == 400
+
+
+def test_api_stats(client):
+    client.get("/api/search?q=test")
+    client.get("/api/search?q=test")
+    res = client.get("/api/stats")
+    assert res.status_code == 200
+    stats = res.get_json()["cache"]["results"]
+    assert stats["hits"] >= 1
+    assert stats["entries"] >= 1
+
+
+def test_api_search_facets(client):
+    res = client.get("/api/search/facets?q=test")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["total"] == 2
+    assert data["moods"]["is_hypothetical"] == 1
+    assert data["subclause_types"]["relcl"] == 1
+    assert data["untagged"] == 2
+
+
+def test_api_suggest(client):
+    res = client.get("/api/suggest?prefix=T")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["terms"] == [
+        {"text": "test", "count": 2},
+        {"text": "two", "count": 1},
+    ]
+    assert data["syllabary"] == []
+
+    res = client.get("/api/suggest?prefix=sent&limit=1")
+    assert res.get_json()["data"]["terms"] == [{"text": "sentence", "count": 2}]
+
+    assert client.get("/api/suggest?prefix=x&limit=abc").status_code == 400
+
+
+def test_api_suggest_survives_tag_writes(client):
+    client.get("/api/suggest?prefix=T")
+    vocabularies = suggester._get_vocabularies()
+
+    res = client.post("/api/sentences/api1/tags", json={"word_index": 0, "tag": "x"})
+    assert res.status_code == 200
+    client.get("/api/suggest?prefix=T")
+    assert suggester._get_vocabularies() is vocabularies
+
+
+def test_api_search_batch(client):
+    res = client.post(
+        "/api/search/batch",
+        json={
+            "searches": [
+                {"q": "one"},
+                {"q": "", "is_command": True, "subclause_types": ["relcl"]},
+                {"q": "sentence", "cursor": "bogus"},
+                {"q": "one AND"},
+            ],
+            "parallel": True,
+        },
+    )
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert [r["ref_id"] for r in data[0]["data"]] == ["api1"]
+    assert [r["ref_id"] for r in data[1]["data"]] == ["api2"]
+    assert data[1]["meta"]["total"] == 1
+    assert "error" in data[2]
+    # Bad FTS5 syntax fails only its own search
+    assert "error" in data[3]
+
+    res = client.get("/api/search?q=one%20AND")
+    assert res.status_code == 400
+
+    res = client.post("/api/search/batch", json={"searches": []})
+    assert res.status_code == 400
+
+
+def test_api_search_export(client):
+    SentenceTag.create(ref_id="api2", word_index=1, tag="converb")
+
+    res = client.get("/api/search/export?q=sentence")
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert [r["ref_id"] for r in rows] == ["api1", "api2"]
+    assert rows[1]["tags"] == [{"word_index": 1, "tag": "converb"}]
+
+    res = client.get("/api/search/export?q=&is_command=true&format=csv")
+    assert res.mimetype == "text/csv"
+    header, *rows = list(csv.reader(io.StringIO(res.get_data(as_text=True))))
+    assert header[0] == "ref_id"
+    assert [r[0] for r in rows] == ["api2"]
+    assert json.loads(rows[0][-1]) == [{"word_index": 1, "tag": "converb"}]
+
+    assert client.get("/api/search/export?q=x&format=xml").status_code == 400
+    assert client.get("/api/search/export?q=x&mode=bogus").status_code == 400
+    # Bad FTS5 syntax is found before the response starts
+    assert client.get("/api/search/export?q=x%20AND").status_code == 400
+
+    res = client.get("/api/search/export?q=nomatch")
+    assert res.status_code == 200
+    assert res.get_data() == b""
+
+
+def test_api_search_etag(client):
+    res = client.get("/api/search?q=Test")
+    etag = res.headers["ETag"]
+    # Weak, since meta.execution_time differs between builds
+    assert etag.startswith('W/"')
+    assert "must-revalidate" in res.headers["Cache-Control"]
+
+    res = client.get("/api/search?q=Test", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+    # Other parameters are another resource
+    res = client.get("/api/search?q=one", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+
+    client.post("/api/sentences/api1/tags", json={"word_index": 0, "tag": "converb"})
+    res = client.get("/api/search?q=Test", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+    # A re-ingest, e.g. from another process
+    etag = res.headers["ETag"]
+    bump_corpus_version(db)
+    res = client.get("/api/search?q=Test", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+
+
+def test_api_search_etag_sees_other_workers(client):
+    res = client.get("/api/search?q=Test")
+    etag = res.headers["ETag"]
+    assert res.get_json()["data"][0]["tags"] == []
+
+    # A tag written by another worker process, committed with its revision
+    with db.atomic():
+        SentenceTag.create(ref_id="api1", word_index=0, tag="converb")
+        Revision.bump(db, "tags")
+
+    res = client.get("/api/search?q=Test", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert res.get_json()["data"][0]["tags"] != []
+
+
+def test_api_tagging_groups_etag(client):
+    TaggingGroup.create_table()
+    res = client.get("/api/tagging-groups")
+    etag = res.headers["ETag"]
+    res = client.get("/api/tagging-groups", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    client.post("/api/tagging-groups", json={"name": "g", "tags": [], "filters": {}})
+    res = client.get("/api/tagging-groups", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert [g["name"] for g in res.get_json()] == ["g"]
+
+    # A group deleted by another worker process
+    etag = res.headers["ETag"]
+    with db.atomic():
+        TaggingGroup.delete().execute()
+        Revision.bump(db, "groups")
+    res = client.get("/api/tagging-groups", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.get_json() == []
+
+
+def test_api_search_fields(client):
+    res = client.get("/api/search?q=Test&fields=english,tags")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert {tuple(sorted(r)) for r in data} == {("english", "ref_id", "tags")}
+
+    res = client.get("/api/search?q=Test&fields=ref_id")
+    assert res.get_json()["data"][0] == {"ref_id": "api1"}
+
+    assert client.get("/api/search?q=Test&fields=secret").status_code == 400
+
+
+def test_api_search_compression(client, monkeypatch):
+    monkeypatch.setattr("src.web.COMPRESS_MIN_BYTES", 0)
+    res = client.get("/api/search?q=Test", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["Vary"]
+    body = json.loads(gzip.decompress(res.get_data()))
+    assert len(body["data"]) == 2
+    # No timestamp in the gzip header
+    assert res.get_data()[4:8] == bytes(4)
+
+    # The client echoes the suffixed ETag back
+    etag = res.headers["ETag"]
+    assert etag.endswith('-gzip"')
+    res = client.get(
+        "/api/search?q=Test",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+    )
+    assert res.status_code == 304
+
+    res = client.get("/api/search?q=Test")
+    assert "Content-Encoding" not in res.headers
+
+
+def test_api_search_brotli(client, monkeypatch):
+    brotli = pytest.importorskip("brotli")
+    monkeypatch.setattr("src.web.COMPRESS_MIN_BYTES", 0)
+    res = client.get("/api/search?q=Test", headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["Content-Encoding"] == "br"
+    assert res.headers["ETag"].endswith('-br"')
+    body = json.loads(brotli.decompress(res.get_data()))
+    assert len(body["data"]) == 2
+
+
+def test_api_search_timings_and_explain(client, monkeypatch):
+    res = client.get("/api/search?q=Test&timings=true")
+    assert "fetch" in res.get_json()["meta"]["timings"]
+    res = client.get("/api/search?q=Test")
+    assert "timings" not in res.get_json()["meta"]
+
+    assert client.get("/api/search/explain?q=Test").status_code == 404
+    monkeypatch.setattr("src.app.SEARCH_EXPLAIN", True)
+    res = client.get("/api/search/explain?q=Test&is_command=true")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["rows"]["matches"] == 1
+    assert data["stages"]["count"]["plan"]
+
+
+def test_api_metrics(client):
+    client.get("/api/search?q=Test&is_command=true")
+    client.post("/api/sentences/api1/tags", json={"word_index": 0, "tag": "converb"})
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.mimetype == "text/plain"
+    text = res.get_data(as_text=True)
+    assert (
+        'http_requests_total{route="/api/search",method="GET",status="200",'
+        'shape="q+is_command"}' in text
+    )
+    assert 'http_request_duration_seconds_bucket{route="/api/search"' in text
+    assert 'tag_writes_total{kind="tag",op="add"}' in text
+    assert 'search_cache_hit_ratio{cache="results"}' in text
+    assert 'db_connections{state="in_use"}' in text
@@ -6,6 +6,7 @@ from peewee import SqliteDatabase
 
 from src.models import (
     Sentence,
+    SentenceClause,
     SentenceGroup,
     SentenceIndex,
     SentenceTag,
@@ -22,30 +23,36 @@ def test_db():
     db.initialize(test_db)
     db.connect()
     db.create_tables(
-        [Sentence, SentenceIndex, SentenceTag, SentenceGroup, TaggingGroup]
+        [
+            Sentence,
+            SentenceClause,
+            SentenceIndex,
+            SentenceTag,
+            SentenceGroup,
+            TaggingGroup,
+        ]
     )
 
     # Sample data
-    Sentence.create(
+    sentence = Sentence.create(
         ref_id="time1",
         english="I will go when he comes.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    sentence = Sentence.create(
         ref_id="time2",
         english="He ate after he arrived.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
     )
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
     Sentence.create(
         ref_id="plain1",
         english="This is a plain sentence.",
         syllabary="syllabary words",
         phonetic="...",
-        subclause_types=None,
     )
 
     SentenceIndex.rebuild()
@@ -54,7 +61,14 @@ def test_db():
 
     if not test_db.is_closed():
         db.drop_tables(
-            [Sentence, SentenceIndex, SentenceTag, SentenceGroup, TaggingGroup]
+            [
+                Sentence,
+                SentenceClause,
+                SentenceIndex,
+                SentenceTag,
+                SentenceGroup,
+                TaggingGroup,
+            ]
         )
         db.close()
     if os.path.exists(db_path):
@@ -0,0 +1,58 @@
+import threading
+
+from werkzeug.datastructures import MultiDict
+
+from src.metrics import Registry, filter_shape
+
+
+def test_filter_shape():
+    args = MultiDict(
+        [("q", "cat"), ("is_command", "true"), ("use_lemma", "false"), ("limit", "5")]
+    )
+    assert filter_shape(args) == "q+is_command"
+    assert filter_shape(MultiDict()) == "none"
+
+
+def test_counters_summed_across_threads():
+    registry = Registry()
+    hits = registry.counter("hits_total", "Hits.", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+
+    def work():
+        for _ in range(1000):
+            hits.inc("/a")
+        latency.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    hits.inc("/b")
+    latency.observe(5)
+
+    text = registry.render()
+    assert 'hits_total{route="/a"} 4000' in text
+    assert 'hits_total{route="/b"} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1"} 4' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 5' in text
+    assert "latency_seconds_count 5" in text
+
+    # Finished threads' shards are folded together, and still counted
+    assert len(registry._shards) == 1
+    assert 'hits_total{route="/a"} 4000' in registry.render()
+
+
+def test_exited_threads_retired_without_scrape():
+    registry = Registry()
+    hits = registry.counter("hits_total", "Hits.")
+
+    for _ in range(200):
+        t = threading.Thread(target=hits.inc)
+        t.start()
+        t.join()
+
+    # Only shards of live threads are kept, even before any scrape
+    assert len(registry._shards) == 0
+    assert "hits_total 200" in registry.render()
@@ -1,7 +1,7 @@
 import pytest
 import spacy
 
-from src.nlp import is_command, is_hypothetical, is_inability
+from src.nlp import is_command, is_hypothetical, is_inability, is_time_clause
 
 
 @pytest.fixture(scope="module")
@@ -66,3 +66,18 @@ def test_is_hypothetical(nlp, text, expected):
 def test_is_inability(nlp, text, expected):
     doc = nlp(text)
     assert is_inability(doc) == expected
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("I will go when he comes.", True),
+        ("He ate after he arrived.", True),
+        ("Wait until the rain stops.", True),
+        ("Because it rained, we stayed.", False),
+        ("It is raining.", False),
+    ],
+)
+def test_is_time_clause(nlp, text, expected):
+    doc = nlp(text)
+    assert is_time_clause(doc) == expected
@@ -0,0 +1,128 @@
+import os
+import threading
+
+import pytest
+from peewee import OperationalError, SqliteDatabase
+
+from src.database import SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_MB
+from src.models import Sentence, SentenceTag, db
+from src.pool import ConnectionPool
+from src.search import SearchEngine
+
+
+@pytest.fixture
+def pool():
+    db_path = "test_pool.db"
+    setup_db = SqliteDatabase(db_path)
+    db.initialize(setup_db)
+    db.connect()
+    db.create_tables([Sentence, SentenceTag])
+    Sentence.create(ref_id="1", english="one", syllabary="...", phonetic="...")
+    db.close()
+
+    pool = ConnectionPool(db_path, size=2)
+    pool.install()
+
+    yield pool
+
+    if not db.is_closed():
+        db.close()
+    pool.reader.close_all()
+    pool.writer.close()
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+
+def test_reads_are_pooled_and_read_only(pool):
+    with db.connection_context():
+        assert Sentence.select().count() == 1
+        with pytest.raises(OperationalError):
+            Sentence.create(ref_id="2", english="two", syllabary="", phonetic="")
+    with db.connection_context():
+        assert Sentence.select().count() == 1
+
+    stats = pool.stats()
+    assert stats["active"]
+    assert stats["size"] == 2
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+    assert stats["checkouts"] == 2
+
+
+def test_writes_go_through_writer(pool):
+    with pool.write() as writer:
+        assert writer is pool.writer
+        SentenceTag.insert(ref_id="1", word_index=0, tag="converb").execute(writer)
+
+    with db.connection_context():
+        # Visible to readers, and the tag_count trigger ran
+        assert SentenceTag.select().count() == 1
+        assert Sentence.get(Sentence.ref_id == "1").tag_count == 1
+    assert pool.stats()["writes"] == 1
+
+
+def test_write_falls_back_when_replaced(pool):
+    other = SqliteDatabase(":memory:")
+    db.initialize(other)
+    with pool.write() as writer:
+        assert writer is db
+    assert not pool.stats()["active"]
+
+
+def test_runtime_profile(pool):
+    settings = pool.describe()
+    assert settings["writer"]["journal_mode"] == "wal"
+    assert settings["reader"]["journal_mode"] == "wal"
+    assert settings["reader"]["busy_timeout"] == SQLITE_BUSY_TIMEOUT_MS
+    assert settings["reader"]["cache_size"] == -SQLITE_CACHE_MB * 1024
+    # temp_store=memory
+    assert settings["reader"]["temp_store"] == 2
+
+    assert not pool.optimize()
+    pool.optimizer.interval = 0.001
+    pool.optimizer.last_run -= 1
+    assert pool.optimize()
+    assert pool.stats()["optimize_runs"] == 1
+
+
+def test_pooled_connection_used_from_another_thread(pool):
+    # Opened here, then handed back to the pool
+    with db.connection_context():
+        assert Sentence.select().count() == 1
+
+    counts = []
+    errors = []
+
+    def read():
+        try:
+            with db.connection_context():
+                counts.append(Sentence.select().count())
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+
+    assert not errors
+    assert counts == [1]
+    # The other thread reused the connection opened on this one
+    assert pool.stats()["idle"] == 1
+
+
+def test_batch_workers_leave_pooled_connections_writable(pool):
+    searcher = SearchEngine("test_pool.db")
+    db.close()
+    pages = searcher.search_many(
+        [{"query": "", "sort": "ref_id"}, {"query": "", "sort": "length_asc"}],
+        workers=2,
+    )
+    assert [r.ref_id for r in pages[0].results] == ["1"]
+
+    # Temp tables (e.g. for suggest vocabularies) still work on the
+    # connections the workers handed back
+    for _ in range(2):
+        with db.connection_context():
+            assert db.execute_sql("PRAGMA query_only").fetchone() == (0,)
+            db.execute_sql("CREATE TEMP TABLE scratch (x)")
+            db.execute_sql("DROP TABLE temp.scratch")
@@ -1,10 +1,22 @@
+import json
 import os
 
 import pytest
 from peewee import SqliteDatabase
 
-from src.models import Sentence, SentenceIndex, SentenceTag, db
-from src.search import SearchEngine
+from src.cache import corpus_generation, data_generation
+from src.models import (
+    LemmaForm,
+    Sentence,
+    SentenceIndex,
+    SentenceTag,
+    SentenceTrigramIndex,
+    db,
+)
+from src.phonetic import fold_phonetic
+from src.search import SearchEngine, encode_cursor
+from src.slowlog import SlowQueryLog
+from src.spelling import SpellingIndex
 
 
 @pytest.fixture
@@ -48,7 +60,7 @@ def test_db_session():
     yield db_path
 
     if not test_db.is_closed():
-        db.drop_tables([Sentence, SentenceIndex, SentenceTag])
+        db.drop_tables([Sentence, SentenceIndex, SentenceTag, LemmaForm])
         db.close()
     if os.path.exists(db_path):
         os.remove(db_path)
@@ -86,3 +98,395 @@ def test_lemma_search(searcher):
     results, _ = searcher.search("rain", use_lemma=True)
     assert len(results) == 1
     assert "rains" in results[0].english
+
+
+@pytest.mark.parametrize(
+    "query,sort",
+    [
+        ("", None),
+        ("the", None),
+        ("", "length_asc"),
+        ("", "length_desc"),
+        ("", "words_asc"),
+    ],
+)
+def test_cursor_pagination_matches_offset(searcher, query, sort):
+    expected, total = searcher.search(query, limit=10, sort=sort)
+
+    seen = []
+    cursor = None
+    while True:
+        page = searcher.search(query, limit=1, sort=sort, cursor=cursor)
+        results, page_total = page
+        assert page_total == total
+        seen.extend(r.ref_id for r in results)
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+
+    assert seen == [r.ref_id for r in expected]
+
+
+def test_cursor_rejects_other_sort(searcher):
+    page = searcher.search("", limit=1)
+    with pytest.raises(ValueError):
+        searcher.search("", limit=1, sort="length_asc", cursor=page.next_cursor)
+
+
+@pytest.mark.parametrize(
+    "sort,key",
+    [
+        ("rank", [{"a": 1}, 1]),
+        ("rank", [0.5, "1"]),
+        ("length_asc", [[1], 1]),
+        ("words_desc", [True, 1]),
+        ("length_desc", [3, None]),
+    ],
+)
+def test_cursor_rejects_unbindable_keys(searcher, sort, key):
+    with pytest.raises(ValueError):
+        searcher.search("cat", limit=1, sort=sort, cursor=encode_cursor(sort, key))
+
+
+def test_count_limit(test_db_session):
+    capped = SearchEngine(test_db_session, count_limit=2)
+    page = capped.search("", limit=1)
+    assert page.total_count == 2
+    assert page.total_exact is False
+
+    exact = SearchEngine(test_db_session, count_limit=3)
+    page = exact.search("", limit=1)
+    assert page.total_count == 3
+    assert page.total_exact is True
+
+
+def test_count_cache_invalidated_by_generation(searcher):
+    _, total = searcher.search("", is_command=True)
+    assert total == 1
+
+    Sentence.create(
+        ref_id="4",
+        english="Close the door.",
+        syllabary="...",
+        phonetic="...",
+        is_command=True,
+    )
+    _, total = searcher.search("", is_command=True)
+    assert total == 1  # Still memoized
+
+    data_generation.bump()
+    _, total = searcher.search("", is_command=True)
+    assert total == 2
+
+
+def test_result_cache(searcher):
+    first = searcher.search("cat")
+    second = searcher.search("  cat ")
+    assert second is first
+    stats = searcher.cache_stats()["results"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+    data_generation.bump()
+    third = searcher.search("cat")
+    assert third is not first
+    assert [r.ref_id for r in third.results] == ["3"]
+
+
+def test_lemma_lookup_table(searcher):
+    db.create_tables([LemmaForm])
+    LemmaForm.create(form="rains", lemma="rain")
+    # As ingest does after writing the table
+    data_generation.bump()
+    corpus_generation.bump()
+
+    assert searcher.lemmatize("Rains OR sleeping") == "rain OR sleeping"
+    results, _ = searcher.search("rains", use_lemma=True)
+    assert [r.ref_id for r in results] == ["1"]
+    assert searcher.nlp is None
+
+    # Tag writes don't touch lemmas, so the table isn't read again
+    lemmas = searcher._get_lemmas()
+    data_generation.bump()
+    assert searcher._get_lemmas() is lemmas
+
+
+def test_lemma_search_with_apostrophes(searcher):
+    # Before the table exists, a contraction must still be valid FTS5
+    results, _ = searcher.search("can't stay", use_lemma=True)
+    assert results == []
+
+    Sentence.create(
+        ref_id="4",
+        english="The cat can't sleep.",
+        syllabary="...",
+        phonetic="...",
+        lemma_text="the cat can not sleep .",
+    )
+    SentenceIndex.rebuild()
+    db.create_tables([LemmaForm])
+    LemmaForm.insert_many(
+        [{"form": "ca", "lemma": "can"}, {"form": "n't", "lemma": "not"}]
+    ).execute()
+    data_generation.bump()
+    corpus_generation.bump()
+
+    assert searcher.lemmatize("Can’t sleep") == "can not sleep"
+    # Punctuation FTS5 has no use for is dropped, operators are kept
+    assert searcher.lemmatize("cat's, 'sleep'; rain*") == "cat s sleep rain *"
+    results, _ = searcher.search("can't sleep", use_lemma=True)
+    assert [r.ref_id for r in results] == ["4"]
+    results, _ = searcher.search('"cat can\'t"', use_lemma=True)
+    assert [r.ref_id for r in results] == ["4"]
+
+
+@pytest.mark.parametrize(
+    "query,expression",
+    [
+        ("cat AND", "cat"),
+        ("NOT", ""),
+        ("(cat", "( cat )"),
+        ("cat) OR", "cat"),
+        ("cat AND NOT sleep", "cat NOT sleep"),
+        ("cat (sleep OR book)", "cat AND ( sleep OR book )"),
+        ('"the cat', '"the cat"'),
+        ("cat () OR * book", "cat OR book"),
+    ],
+)
+def test_lemmatize_repairs_operators(searcher, query, expression):
+    assert searcher.lemmatize(query) == expression
+    if expression:
+        # Runs without an FTS5 syntax error
+        searcher.search(query, use_lemma=True)
+    else:
+        with pytest.raises(ValueError):
+            searcher.search(query, use_lemma=True)
+
+
+def test_length_and_word_count(searcher):
+    for ref_id, syllabary in [("1", "ᎠᏂ ᎠᏍᎦᏯ ᎠᎩᏍᏗ"), ("2", "ᎠᏍᎦᏯ"), ("3", "ᎤᏍᏗ ᎧᏁᏍᎦ")]:
+        Sentence.update(
+            syllabary=syllabary,
+            syllabary_length=len(syllabary),
+            word_count=len(syllabary.split()),
+        ).where(Sentence.ref_id == ref_id).execute()
+    data_generation.bump()
+
+    results, _ = searcher.search("", sort="length_asc")
+    assert [r.ref_id for r in results] == ["2", "3", "1"]
+    results, _ = searcher.search("", sort="words_desc")
+    assert [r.ref_id for r in results] == ["1", "3", "2"]
+    results, total = searcher.search("", min_words=2, max_words=2)
+    assert [r.ref_id for r in results] == ["3"]
+    assert total == 1
+
+
+def test_highlight_word_indices(searcher):
+    Sentence.update(syllabary="ᎠᏂ ᎦᏙ ᎠᏍᎦᏯ").where(Sentence.ref_id == "3").execute()
+    SentenceIndex.rebuild()
+    data_generation.bump()
+
+    results, _ = searcher.search("cat", highlight=True)
+    assert results[0].highlights == {"english": [1], "syllabary": [], "phonetic": []}
+    assert "cat" in results[0].snippet
+
+    results, _ = searcher.search("ᎦᏙ", highlight=True)
+    assert results[0].highlights["syllabary"] == [1]
+
+    results, _ = searcher.search('"the cat"', highlight=True)
+    assert results[0].highlights["english"] == [0, 1]
+
+    results, _ = searcher.search("cat")
+    assert results[0].highlights is None
+
+    # Snippets come from the displayed text, not the lemma column matched
+    results, _ = searcher.search("rain", use_lemma=True, highlight=True)
+    assert "rains" in results[0].snippet
+
+
+def test_substring_mode(searcher):
+    Sentence.update(syllabary="ᎠᏂ ᎦᏙᎯ ᎠᏍᎦᏯ", phonetic="ani gadohi asgaya").where(
+        Sentence.ref_id == "3"
+    ).execute()
+    SentenceTrigramIndex.create_table()
+    SentenceTrigramIndex.rebuild()
+    data_generation.bump()
+
+    # Whole-word search misses a morpheme inside a word
+    results, _ = searcher.search("ᏍᎦᏯ")
+    assert results == []
+
+    results, total = searcher.search("ᏍᎦᏯ", mode="substring", highlight=True)
+    assert [r.ref_id for r in results] == ["3"]
+    assert total == 1
+    assert results[0].highlights["syllabary"] == [2]
+    assert results[0].highlights["english"] == []
+
+    results, _ = searcher.search("doh", mode="substring", highlight=True)
+    assert [r.ref_id for r in results] == ["3"]
+    assert results[0].highlights["phonetic"] == [1]
+
+    # Too short for a trigram, so matched without the index
+    results, _ = searcher.search("ᎦᏙ", mode="substring")
+    assert [r.ref_id for r in results] == ["3"]
+
+    with pytest.raises(ValueError):
+        searcher.search("ᎦᏙ", mode="bogus")
+
+
+def test_phonetic_mode(searcher):
+    phonetic = "ná ani:chű:ja sgwà:hle̋:sdi"
+    Sentence.update(phonetic=phonetic, phonetic_folded=fold_phonetic(phonetic)).where(
+        Sentence.ref_id == "2"
+    ).execute()
+    SentenceIndex.rebuild()
+    data_generation.bump()
+
+    assert fold_phonetic(phonetic) == "na anichuja sgwahlesdi"
+    for query in ("anichuja", "ani:chű:ja", "ANICHUJA"):
+        results, _ = searcher.search(query, mode="phonetic")
+        assert [r.ref_id for r in results] == ["2"]
+
+    results, _ = searcher.search("phonetic: sgwà:hle̋:sdi")
+    assert [r.ref_id for r in results] == ["2"]
+    results, _ = searcher.search("anichu*", mode="phonetic")
+    assert [r.ref_id for r in results] == ["2"]
+    # Word indices into the unfolded phonetic text
+    results, _ = searcher.search("sgwahlesdi", mode="phonetic", highlight=True)
+    assert results[0].highlights["phonetic"] == [2]
+    # english words are not matched in phonetic mode
+    results, _ = searcher.search("book", mode="phonetic")
+    assert results == []
+    # ...and phonetic words are not matched outside it
+    results, _ = searcher.search("anichuja")
+    assert results == []
+
+    # A phonetic query with nothing to search is not "no query"
+    for query in ("phonetic:", "phonetic: :"):
+        with pytest.raises(ValueError):
+            searcher.search(query)
+    with pytest.raises(ValueError):
+        searcher.search("::", mode="phonetic")
+    results, _ = searcher.search("", mode="phonetic")
+    assert len(results) == 3
+
+
+def test_spelling_suggestions(searcher, tmp_path):
+    path = tmp_path / "bible.db.spelling"
+    SpellingIndex.build().save(path)
+    searcher.spelling = SpellingIndex.load(path)
+
+    assert searcher.spelling.lookup("slepeing") == ["sleeping"]
+    assert searcher.spelling.lookup("xyzzy") == []
+
+    page = searcher.search("slepeing")
+    assert page.total_count == 0
+    assert page.suggestions == ["sleeping"]
+    page = searcher.search("the bok")
+    assert page.suggestions[0] == "the book"
+
+    # A query with hits gets no suggestions; operators are kept
+    assert searcher.search("sleeping").suggestions == []
+    assert searcher.search("cat AND slepeing").suggestions == ["cat AND sleeping"]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_search_many(searcher, workers):
+    searches = [
+        {"query": "cat"},
+        {"query": "", "is_command": True},
+        {"query": "cat"},
+        {"query": "cat", "sort": "rank", "cursor": "bogus"},
+        {"query": "book OR inside", "limit": 1},
+        {"query": "cat AND"},
+    ]
+    pages = searcher.search_many(searches, workers=workers)
+
+    assert len(pages) == 6
+    assert [r.ref_id for r in pages[0].results] == ["3"]
+    assert [r.ref_id for r in pages[1].results] == ["2"]
+    assert pages[2] is pages[0]
+    assert isinstance(pages[3], ValueError)
+    assert pages[4].total_count == 2
+    assert pages[4] == searcher.search("book OR inside", limit=1)
+    assert isinstance(pages[5], ValueError)
+
+
+def test_fields_projection(searcher):
+    results, _ = searcher.search("cat", fields=["english"])
+    assert results[0].english == "The cat is sleeping."
+    assert results[0].ref_id == "3"
+    assert results[0].syllabary is None
+    assert results[0].tags is None
+
+    with pytest.raises(ValueError):
+        searcher.search("cat", fields=["secret"])
+
+
+def test_stage_timings(searcher):
+    page = searcher.search("cat", use_lemma=True)
+    assert {"lemmatize", "filter_index", "count", "fetch", "hydrate"} <= set(
+        page.timings
+    )
+    assert all(ms >= 0 for ms in page.timings.values())
+    assert "MATCH" in page.sql
+    # The lemmatized MATCH expression is bound, not inlined
+    assert "lemma_text: (cat)" in page.sql_params
+
+    assert "suggest" in searcher.search("xyzzy").timings
+
+
+def test_explain(searcher):
+    plan = searcher.explain("cat OR book", is_command=True, limit=1)
+    assert plan["rows"] == {
+        "fts_match": 2,
+        "filter_index": None,
+        "matches": 1,
+        "page": 1,
+    }
+    assert plan["sort_mode"] == "rank"
+    page = plan["stages"]["page"]
+    assert "MATCH" in page["sql"]
+    assert len(page["params"]) == page["sql"].count("?")
+    assert page["plan"] and all("detail" in step for step in page["plan"])
+
+
+def test_slow_query_log(searcher, tmp_path):
+    path = tmp_path / "slow.jsonl"
+    searcher.slow_log = SlowQueryLog(str(path), threshold_ms=0)
+    try:
+        searcher.search("cat", is_command=False, limit=5)
+        searcher.search("cat", is_command=False, limit=5)  # cached, not logged
+
+        searcher.slow_log.threshold_ms = 10_000
+        searcher.search("book")  # fast and not sampled
+        searcher.slow_log.sample_rate = 1.0
+        searcher.search("inside")
+    finally:
+        searcher.slow_log.close()
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e["reason"] for e in entries] == ["slow", "sampled"]
+    slow = entries[0]
+    assert slow["params"]["query"] == "cat"
+    assert slow["params"]["limit"] == 5
+    assert slow["params"]["is_command"] is False
+    assert slow["total"] == 1 and slow["returned"] == 1
+    assert "fetch" in slow["timings"]
+    assert "MATCH" in slow["sql"]
+    # Enough to replay the logged query
+    assert len(slow["sql_params"]) == slow["sql"].count("?")
+    assert "{english lemma_text syllabary}: (cat)" in slow["sql_params"]
+
+
+def test_slow_query_log_no_results(searcher, tmp_path):
+    path = tmp_path / "slow.jsonl"
+    searcher.slow_log = SlowQueryLog(str(path), threshold_ms=0)
+    try:
+        searcher.search("cat", tag_filter="no-such-tag")
+    finally:
+        searcher.slow_log.close()
+
+    (entry,) = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entry["total"] == 0 and entry["returned"] == 0
+    assert entry["params"]["tag_filter"] == "no-such-tag"
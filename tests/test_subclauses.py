@@ -4,7 +4,9 @@ import pytest
 import spacy
 from peewee import SqliteDatabase
 
-from src.models import Sentence, SentenceIndex, SentenceTag, db
+from src.cache import corpus_generation
+from src.filter_index import FilterIndex
+from src.models import Sentence, SentenceClause, SentenceIndex, SentenceTag, db
 from src.search import SearchEngine
 
 
@@ -14,61 +16,61 @@ def test_db_session():
     test_db = SqliteDatabase(db_path)
     db.initialize(test_db)
     db.connect()
-    db.create_tables([Sentence, SentenceIndex, SentenceTag])
+    db.create_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag])
 
     # Sample data with subclause types
-    Sentence.create(
+    sentence = Sentence.create(
         ref_id="1",
         english="When he finished writing letters, he stretched.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
         is_hypothetical=False,
         is_command=False,
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    sentence = Sentence.create(
         ref_id="2",
         english="He said that he was tired.",
         syllabary="...",
         phonetic="...",
-        subclause_types="ccomp",
         is_hypothetical=False,
         is_command=False,
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="ccomp")
+    sentence = Sentence.create(
         ref_id="3",
         english="The boy who is playing ball is my friend.",
         syllabary="...",
         phonetic="...",
-        subclause_types="relcl",
         is_hypothetical=False,
         is_command=False,
     )
+    SentenceClause.create(sentence=sentence, dep_label="relcl")
     Sentence.create(
         ref_id="4",
         english="I see a cat.",
         syllabary="...",
         phonetic="...",
-        subclause_types=None,  # No subclause
         is_hypothetical=False,
         is_command=False,
     )
-    Sentence.create(
+    sentence = Sentence.create(
         ref_id="5",
         english="I want to go when it stops raining.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl,xcomp",  # Multiple
         is_hypothetical=False,
         is_command=False,
     )
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    SentenceClause.create(sentence=sentence, dep_label="xcomp")
 
     SentenceIndex.rebuild()
 
     yield db_path
 
     if not test_db.is_closed():
-        db.drop_tables([Sentence, SentenceIndex, SentenceTag])
+        db.drop_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag])
         db.close()
     if os.path.exists(db_path):
         os.remove(db_path)
@@ -122,3 +124,112 @@ def test_subclause_filter_complex(searcher):
     assert "1" in ids
     assert "3" in ids
     assert "5" in ids
+
+
+@pytest.mark.parametrize(
+    "query,filters",
+    [
+        ("", {"subclause_types": ["advcl"]}),
+        ("", {"subclause_types": ["relcl", "ccomp"]}),
+        ("", {"subclause_types": ["any"]}),
+        ("", {"subclause_types": ["none"]}),
+        ("", {"subclause_types": ["csubj"]}),
+        ("he", {"subclause_types": ["advcl", "none"]}),
+        ("", {"subclause_types": ["advcl"], "is_command": True}),
+    ],
+)
+@pytest.mark.parametrize("max_ids", [500, 0])
+def test_filter_index_matches_sql(
+    test_db_session, tmp_path, monkeypatch, query, filters, max_ids
+):
+    # 0 sends every candidate set through the SQL predicates
+    monkeypatch.setattr("src.search.FILTER_INDEX_MAX_IDS", max_ids)
+    expected, expected_total = SearchEngine(test_db_session).search(
+        query, limit=10, **filters
+    )
+
+    path = tmp_path / "test.filters"
+    FilterIndex.build().save(path)
+    indexed = SearchEngine(test_db_session)
+    indexed.filter_index = FilterIndex.load(path)
+    assert indexed.filter_index.is_current()
+
+    results, total = indexed.search(query, limit=10, **filters)
+    assert total == expected_total
+    assert [r.ref_id for r in results] == [r.ref_id for r in expected]
+
+
+def test_large_candidate_sets_fetch_through_sql(test_db_session, tmp_path, monkeypatch):
+    path = tmp_path / "test.filters"
+    FilterIndex.build().save(path)
+    indexed = SearchEngine(test_db_session)
+    indexed.filter_index = FilterIndex.load(path)
+
+    plan = indexed.explain("", subclause_types=["advcl"], sort="length_asc")
+    assert "json_each" in plan["stages"]["page"]["sql"]
+
+    # Past the limit the page walks the dep_label index rather than loading
+    # and sorting every candidate id, while the bitmap still gives the total
+    monkeypatch.setattr("src.search.FILTER_INDEX_MAX_IDS", 1)
+    plan = indexed.explain("", subclause_types=["advcl"], sort="length_asc")
+    page = plan["stages"]["page"]
+    assert "json_each" not in page["sql"]
+    assert any("sentenceclause_dep_label" in step["detail"] for step in page["plan"])
+    assert plan["rows"]["filter_index"] == 2
+    _, total = indexed.search("", subclause_types=["advcl"])
+    assert total == 2
+
+
+def test_filter_index_reloaded_after_reingest(test_db_session, tmp_path):
+    db_path = str(tmp_path / "test.db")
+    FilterIndex.build().save(FilterIndex.path_for(db_path))
+    indexed = SearchEngine(db_path)
+    _, total = indexed.search("", subclause_types=["advcl"])
+    assert total == 2
+
+    # A re-ingest rewrites the sentences and the index, then bumps the corpus
+    SentenceClause.delete().where(SentenceClause.dep_label == "advcl").execute()
+    FilterIndex.build().save(FilterIndex.path_for(db_path))
+    corpus_generation.bump()
+
+    _, total = indexed.search("", subclause_types=["advcl"], limit=5)
+    assert total == 0
+
+
+def test_subclause_filter_exact_label(searcher):
+    # "csubj" must not match inside "csubjpass"
+    sentence = Sentence.create(
+        ref_id="6",
+        english="That he was chosen was announced.",
+        syllabary="...",
+        phonetic="...",
+    )
+    SentenceClause.create(sentence=sentence, dep_label="csubjpass")
+
+    results, _ = searcher.search("", subclause_types=["csubj"])
+    assert results == []
+
+    results, _ = searcher.search("", subclause_types=["csubjpass"])
+    assert [r.ref_id for r in results] == ["6"]
+
+
+def test_facets(test_db_session, tmp_path):
+    SentenceTag.create(ref_id="1", word_index=0, tag="converb")
+    SentenceTag.create(ref_id="5", word_index=2, tag="converb")
+
+    searcher = SearchEngine(test_db_session)
+    facets = searcher.facets("", subclause_types=["any"])
+    assert facets["total"] == 4
+    assert facets["subclause_types"]["advcl"] == 2
+    assert facets["subclause_types"]["xcomp"] == 1
+    assert facets["subclause_types"]["any"] == 4
+    assert facets["subclause_types"]["none"] == 0
+    assert facets["moods"]["is_command"] == 0
+    assert facets["tags"] == {"converb": 2}
+    assert facets["untagged"] == 2
+
+    path = tmp_path / "test.filters"
+    FilterIndex.build().save(path)
+    indexed = SearchEngine(test_db_session)
+    indexed.filter_index = FilterIndex.load(path)
+    assert indexed.facets("", subclause_types=["any"]) == facets
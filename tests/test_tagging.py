@@ -5,7 +5,14 @@ import pytest
 from peewee import SqliteDatabase
 
 from src.app import app
-from src.models import Sentence, SentenceIndex, SentenceTag, db
+from src.models import (
+    Revision,
+    Sentence,
+    SentenceClause,
+    SentenceIndex,
+    SentenceTag,
+    db,
+)
 from src.search import SearchEngine
 
 
@@ -15,36 +22,37 @@ def test_db():
     test_db = SqliteDatabase(db_path)
     db.initialize(test_db)
     db.connect()
-    db.create_tables([Sentence, SentenceIndex, SentenceTag])
+    db.create_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag, Revision])
 
     # Sample data
-    Sentence.create(
+    sentence = Sentence.create(
         ref_id="time1",
         english="I will go when he comes.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
+        is_time_clause=True,
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    sentence = Sentence.create(
         ref_id="time2",
         english="He ate after he arrived.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
+        is_time_clause=True,
     )
-    Sentence.create(
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
+    sentence = Sentence.create(
         ref_id="nontime1",
         english="Because it rained, we stayed.",
         syllabary="...",
         phonetic="...",
-        subclause_types="advcl",
     )
+    SentenceClause.create(sentence=sentence, dep_label="advcl")
     Sentence.create(
         ref_id="plain1",
         english="This is a plain sentence.",
         syllabary="syllabary words",
         phonetic="...",
-        subclause_types=None,
     )
 
     SentenceIndex.rebuild()
@@ -52,7 +60,7 @@ def test_db():
     yield db_path
 
     if not test_db.is_closed():
-        db.drop_tables([Sentence, SentenceIndex, SentenceTag])
+        db.drop_tables([Sentence, SentenceClause, SentenceIndex, SentenceTag, Revision])
         db.close()
     if os.path.exists(db_path):
         os.remove(db_path)
@@ -155,3 +163,25 @@ def test_untagged_only_filter(searcher, client):
     assert data["meta"]["total"] == 3
     api_ids = {r["ref_id"] for r in data["data"]}
     assert "time1" not in api_ids
+
+
+def test_tag_count_triggers(client):
+    def tag_count():
+        return Sentence.get(Sentence.ref_id == "plain1").tag_count
+
+    client.post("/api/sentences/plain1/tags", json={"word_index": 0, "tag": "converb"})
+    client.post("/api/sentences/plain1/tags", json={"word_index": 1, "tag": "converb"})
+    assert tag_count() == 2
+
+    # Re-tagging a word replaces the row rather than adding one
+    client.post(
+        "/api/sentences/plain1/tags", json={"word_index": 1, "tag": "yi+converb"}
+    )
+    assert tag_count() == 2
+
+    client.delete("/api/sentences/plain1/tags", json={"word_index": 0})
+    assert tag_count() == 1
+
+    Sentence.update(tag_count=0).execute()
+    SentenceTag.sync_tag_counts()
+    assert tag_count() == 1